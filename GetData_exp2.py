@@ -71,8 +71,10 @@ class GetData_exp1(tk.Tk):
             self.label.config(text=f"recording")
             self.max_count = int(self.count_max_box.get())
             if self.count < self.max_count:
-                range_data = self.liner.range_data
-                estimated_data = self.liner.estimated_data
+                # 同じフレームの値を書き込むため一度取り出す
+                frame = self.liner.frame
+                range_data = frame.range_data
+                estimated_data = frame.estimated_data
                 self.range_writer.writerow(range_data)
                 self.estimated_writer.writerow(estimated_data)
                 self.count += 1
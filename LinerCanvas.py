@@ -1,4 +1,5 @@
 from LinerTouch import LinerTouch
+from tk_bridge import TkCallbackBridge
 import keyboard
 import tkinter as tk
 import time
@@ -25,7 +26,10 @@ class LinerCanvas(tk.Tk):  # tk.Tk を継承
             self, width=self.canvas_width, height=self.canvas_height, bg="white"
         )
         self.canvas.pack()
-        self.liner.update_callback = self.render_loop
+        # コールバックは LinerTouch のスレッドで呼ばれるため、
+        # Tk のメインループで画面の更新ごとに最新の1回だけ描画する
+        self.tk_bridge = TkCallbackBridge(self)
+        self.liner.update_callback = self.tk_bridge.coalesce(self.render_loop)
         # self.liner.tap_callback = self.draw_tap_point
 
     def render_loop(self):
@@ -53,8 +57,9 @@ class LinerCanvas(tk.Tk):  # tk.Tk を継承
 
     # 指定された位置 (x, y) に目印の点を描画
     def draw_point(self, size=30):
-        for pos in self.liner.estimated_data:
-            idx = self.liner.estimated_data.index(pos)
+        estimated_data = self.liner.frame.estimated_data
+        for pos in estimated_data:
+            idx = estimated_data.index(pos)
             if idx < 2:
                 x = pos[0] * self.x_rate
                 y = pos[1] * self.y_rate
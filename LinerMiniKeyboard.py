@@ -2,6 +2,7 @@ import tkinter as tk
 import logging
 import math
 from LinerTouch import LinerTouch
+from tk_bridge import TkCallbackBridge
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +27,15 @@ class KanaKeyboard:
         # (row, col) → (col, row) に変換
         self.kana_map = {(col, row): kana for (row, col), kana in self.kana_map.items()}
 
+        # コールバックは LinerTouch のスレッドで呼ばれるため、
+        # Tk のメインループに渡して実行する
+        self.tk_bridge = TkCallbackBridge(master)
+
         # LinerTouch のインスタンス（1本指＆ダブルタップ検出用）
-        # update_callback: センサ座標が更新される度に呼ばれる
+        # update_callback: センサ座標が更新される度に呼ばれる (画面の更新ごとに最新の1回)
         # tap_callback: ダブルタップで呼ばれる
-        self.liner = LinerTouch(update_callback=self.update_keyboard,
-                                tap_callback=self.tap_action,
+        self.liner = LinerTouch(update_callback=self.tk_bridge.coalesce(self.update_keyboard),
+                                tap_callback=self.tk_bridge.post(self.tap_action),
                                 plot_graph=False)
 
         # キャンバス設定
@@ -51,6 +56,13 @@ class KanaKeyboard:
         self.pointer_x = 0  # キーボード上の列
         self.pointer_y = 0  # キーボード上の行
 
+        # キャンバスに描画済みのオフセット・スケール・フォントの大きさ
+        # (create_keyboard の後は redraw_keyboard で差分だけ反映する)
+        self.drawn_offset_x = None
+        self.drawn_offset_y = None
+        self.drawn_scale = None
+        self.drawn_font_size = None
+
         self.create_keyboard()      # キーボード描画
         self.draw_pointer()         # ポインタ描画
 
@@ -58,10 +70,13 @@ class KanaKeyboard:
         self.last_finger_x = None
         self.last_finger_y = None
 
+    def font_size(self):
+        return int(12 * self.current_scale)
+
     def create_keyboard(self):
-        """50音キーボードを描画"""
-        self.canvas.delete("kana_button")
-        self.canvas.delete("kana_text")
+        """50音キーボードを描画 (アイテムは最初に一度だけ作る)"""
+        self.canvas.delete("kana_key")
+        self.drawn_font_size = self.font_size()
 
         for (col, row), kana in self.kana_map.items():
             x = self.key_margin + col * (self.button_width + self.key_margin)
@@ -78,34 +93,64 @@ class KanaKeyboard:
                 scaled_y + scaled_height + self.offset_y,
                 fill="lightblue",
                 outline="black",
-                tags=("kana_button", kana),
+                tags=("kana_key", "kana_button", kana),
             )
             self.canvas.create_text(
                 scaled_x + scaled_width / 2 + self.offset_x,
                 scaled_y + scaled_height / 2 + self.offset_y,
                 text=kana,
-                font=("Arial", int(12 * self.current_scale)),
-                tags=("kana_text", kana),
+                font=("Arial", self.drawn_font_size),
+                tags=("kana_key", "kana_text", kana),
+            )
+
+        self.drawn_offset_x = self.offset_x
+        self.drawn_offset_y = self.offset_y
+        self.drawn_scale = self.current_scale
+
+    def redraw_keyboard(self):
+        """
+        前回の描画からのオフセット・スケールの変化だけをキャンバスに反映する。
+        アイテムは作り直さず、"kana_key" タグに canvas.scale / canvas.move を
+        まとめて適用し、フォントは大きさが変わる場合だけ設定し直す。
+        """
+        if self.current_scale != self.drawn_scale:
+            # キーボードの原点 (描画済みのオフセット) を中心に拡大縮小する
+            ratio = self.current_scale / self.drawn_scale
+            self.canvas.scale(
+                "kana_key", self.drawn_offset_x, self.drawn_offset_y, ratio, ratio
             )
+            self.drawn_scale = self.current_scale
+            font_size = self.font_size()
+            if font_size != self.drawn_font_size:
+                self.canvas.itemconfigure("kana_text", font=("Arial", font_size))
+                self.drawn_font_size = font_size
+
+        dx = self.offset_x - self.drawn_offset_x
+        dy = self.offset_y - self.drawn_offset_y
+        if dx != 0 or dy != 0:
+            self.canvas.move("kana_key", dx, dy)
+            self.drawn_offset_x = self.offset_x
+            self.drawn_offset_y = self.offset_y
 
     def draw_pointer(self, x=None, y=None):
         """現在の pointer_x, pointer_y を赤丸で表示"""
-        self.canvas.delete("pointer")
-
         if x is None or y is None:
             canvas_x, canvas_y = self.keyboard_to_canvas_coordinates(self.pointer_x, self.pointer_y)
         else:
             canvas_x, canvas_y = x, y
 
         pointer_size = 10 * self.current_scale
-        self.canvas.create_oval(
+        bbox = (
             canvas_x - pointer_size / 2,
             canvas_y - pointer_size / 2,
             canvas_x + pointer_size / 2,
             canvas_y + pointer_size / 2,
-            fill="red",
-            tags="pointer",
         )
+        # 赤丸は最初に一度だけ作り、以降は coords で移動する
+        if self.canvas.find_withtag("pointer"):
+            self.canvas.coords("pointer", *bbox)
+        else:
+            self.canvas.create_oval(*bbox, fill="red", tags="pointer")
 
     def keyboard_to_canvas_coordinates(self, key_x, key_y):
         """
@@ -154,7 +199,7 @@ class KanaKeyboard:
         1本指の移動量を計算し、キーボードをドラッグ(オフセット変更)。
         ついでにポインタを移動（キー上の行列計算）する。
         """
-        estimated_data = self.liner.estimated_data
+        estimated_data = self.liner.frame.estimated_data
         if len(estimated_data) == 1:
             finger_x, finger_y = estimated_data[0]
             canvas_x, canvas_y = self.sensor_to_canvas_coordinates([finger_x, finger_y])
@@ -167,8 +212,8 @@ class KanaKeyboard:
                 self.offset_x += dx
                 self.offset_y += dy
 
-                # キーボード描画更新
-                self.create_keyboard()
+                # キーボード描画更新 (差分だけ反映する)
+                self.redraw_keyboard()
 
             # ポインタ位置をキー座標系に変換
             col, row = self.canvas_to_keyboard_coordinates(canvas_x, canvas_y)
@@ -211,6 +256,7 @@ import tkinter as tk
 import logging
 import math
 from LinerTouch import LinerTouch
+from tk_bridge import TkCallbackBridge
 
 logger = logging.getLogger(__name__)
 
@@ -235,11 +281,15 @@ class KanaKeyboard:
         # (row, col) → (col, row) に変換
         self.kana_map = {(col, row): kana for (row, col), kana in self.kana_map.items()}
 
+        # コールバックは LinerTouch のスレッドで呼ばれるため、
+        # Tk のメインループに渡して実行する
+        self.tk_bridge = TkCallbackBridge(master)
+
         # LinerTouch のインスタンス（1本指＆ダブルタップ検出用）
-        # update_callback: センサ座標が更新される度に呼ばれる
+        # update_callback: センサ座標が更新される度に呼ばれる (画面の更新ごとに最新の1回)
         # tap_callback: ダブルタップで呼ばれる
-        self.liner = LinerTouch(update_callback=self.update_keyboard,
-                                tap_callback=self.tap_action,
+        self.liner = LinerTouch(update_callback=self.tk_bridge.coalesce(self.update_keyboard),
+                                tap_callback=self.tk_bridge.post(self.tap_action),
                                 plot_graph=False)
 
         # キャンバス設定
@@ -260,6 +310,13 @@ class KanaKeyboard:
         self.pointer_x = 0  # キーボード上の列
         self.pointer_y = 0  # キーボード上の行
 
+        # キャンバスに描画済みのオフセット・スケール・フォントの大きさ
+        # (create_keyboard の後は redraw_keyboard で差分だけ反映する)
+        self.drawn_offset_x = None
+        self.drawn_offset_y = None
+        self.drawn_scale = None
+        self.drawn_font_size = None
+
         self.create_keyboard()      # キーボード描画
         self.draw_pointer()         # ポインタ描画
 
@@ -267,10 +324,13 @@ class KanaKeyboard:
         self.last_finger_x = None
         self.last_finger_y = None
 
+    def font_size(self):
+        return int(12 * self.current_scale)
+
     def create_keyboard(self):
-        """50音キーボードを描画"""
-        self.canvas.delete("kana_button")
-        self.canvas.delete("kana_text")
+        """50音キーボードを描画 (アイテムは最初に一度だけ作る)"""
+        self.canvas.delete("kana_key")
+        self.drawn_font_size = self.font_size()
 
         for (col, row), kana in self.kana_map.items():
             x = self.key_margin + col * (self.button_width + self.key_margin)
@@ -287,34 +347,64 @@ class KanaKeyboard:
                 scaled_y + scaled_height + self.offset_y,
                 fill="lightblue",
                 outline="black",
-                tags=("kana_button", kana),
+                tags=("kana_key", "kana_button", kana),
             )
             self.canvas.create_text(
                 scaled_x + scaled_width / 2 + self.offset_x,
                 scaled_y + scaled_height / 2 + self.offset_y,
                 text=kana,
-                font=("Arial", int(12 * self.current_scale)),
-                tags=("kana_text", kana),
+                font=("Arial", self.drawn_font_size),
+                tags=("kana_key", "kana_text", kana),
+            )
+
+        self.drawn_offset_x = self.offset_x
+        self.drawn_offset_y = self.offset_y
+        self.drawn_scale = self.current_scale
+
+    def redraw_keyboard(self):
+        """
+        前回の描画からのオフセット・スケールの変化だけをキャンバスに反映する。
+        アイテムは作り直さず、"kana_key" タグに canvas.scale / canvas.move を
+        まとめて適用し、フォントは大きさが変わる場合だけ設定し直す。
+        """
+        if self.current_scale != self.drawn_scale:
+            # キーボードの原点 (描画済みのオフセット) を中心に拡大縮小する
+            ratio = self.current_scale / self.drawn_scale
+            self.canvas.scale(
+                "kana_key", self.drawn_offset_x, self.drawn_offset_y, ratio, ratio
             )
+            self.drawn_scale = self.current_scale
+            font_size = self.font_size()
+            if font_size != self.drawn_font_size:
+                self.canvas.itemconfigure("kana_text", font=("Arial", font_size))
+                self.drawn_font_size = font_size
+
+        dx = self.offset_x - self.drawn_offset_x
+        dy = self.offset_y - self.drawn_offset_y
+        if dx != 0 or dy != 0:
+            self.canvas.move("kana_key", dx, dy)
+            self.drawn_offset_x = self.offset_x
+            self.drawn_offset_y = self.offset_y
 
     def draw_pointer(self, x=None, y=None):
         """現在の pointer_x, pointer_y を赤丸で表示"""
-        self.canvas.delete("pointer")
-
         if x is None or y is None:
             canvas_x, canvas_y = self.keyboard_to_canvas_coordinates(self.pointer_x, self.pointer_y)
         else:
             canvas_x, canvas_y = x, y
 
         pointer_size = 10 * self.current_scale
-        self.canvas.create_oval(
+        bbox = (
             canvas_x - pointer_size / 2,
             canvas_y - pointer_size / 2,
             canvas_x + pointer_size / 2,
             canvas_y + pointer_size / 2,
-            fill="red",
-            tags="pointer",
         )
+        # 赤丸は最初に一度だけ作り、以降は coords で移動する
+        if self.canvas.find_withtag("pointer"):
+            self.canvas.coords("pointer", *bbox)
+        else:
+            self.canvas.create_oval(*bbox, fill="red", tags="pointer")
 
     def keyboard_to_canvas_coordinates(self, key_x, key_y):
         """
@@ -363,7 +453,7 @@ class KanaKeyboard:
         1本指の移動量を計算し、キーボードをドラッグ(オフセット変更)。
         ついでにポインタを移動（キー上の行列計算）する。
         """
-        estimated_data = self.liner.estimated_data
+        estimated_data = self.liner.frame.estimated_data
         if len(estimated_data) == 1:
             finger_x, finger_y = estimated_data[0]
             canvas_x, canvas_y = self.sensor_to_canvas_coordinates([finger_x, finger_y])
@@ -376,8 +466,8 @@ class KanaKeyboard:
                 self.offset_x += dx
                 self.offset_y += dy
 
-                # キーボード描画更新
-                self.create_keyboard()
+                # キーボード描画更新 (差分だけ反映する)
+                self.redraw_keyboard()
 
             # ポインタ位置をキー座標系に変換
             col, row = self.canvas_to_keyboard_coordinates(canvas_x, canvas_y)
@@ -29,8 +29,13 @@ VL6180X データシートの「連続モードの制限」のセクションと
 
 #define HEAD_SENSOR 0
 #define TAIL_SENSOR 9
+// 1枚のボードにつなげるセンサの最大数 (pin[] の数)
+// それより長いバーは複数のボードをつなげ、ホスト側の設定 (array_geometry.py) で並べる
 #define MAX_NUM_SENSOR 10
-#define NUM_SENSOR TAIL_SENSOR - HEAD_SENSOR + 1
+#define NUM_SENSOR (TAIL_SENSOR - HEAD_SENSOR + 1)
+#if NUM_SENSOR > MAX_NUM_SENSOR
+#error "NUM_SENSOR は MAX_NUM_SENSOR 以下にする"
+#endif
 #define CALIBRATE_TIMES 30
 #define CALIBRATE_CHECK_TIMES 10
 #define TARGET_DISTANCE 50
@@ -42,6 +47,22 @@ VL6180X データシートの「連続モードの制限」のセクションと
 // 範囲外だった場合の出力する値の設定
 #define OUT_OF_RANGE_OUTPUT true
 
+// テキストのフレームの先頭にフレーム番号と micros() を "@<seq>:<micros> " で出力するかの設定
+#define FRAME_INFO_OUTPUT true
+
+// バイナリのフレームで出力するかの設定 (false の場合はテキストで出力)
+// フレームの構成 (リトルエンディアン, frame_codec.py と合わせる)
+//   sync(1) | seq(2) | timestamp(4) | count(1) | range(count) | crc8(1)
+// 範囲外のセンサは OUT_OF_RANGE_VALUE を出力する
+#define BINARY_FRAME_MODE false
+#define FRAME_SYNC 0xA5
+#define OUT_OF_RANGE_VALUE 255
+#define FRAME_HEADER_SIZE 8
+#define FRAME_SIZE (FRAME_HEADER_SIZE + (NUM_SENSOR) + 1)
+
+// Bluetooth のデバイス名 (複数のボードを使う場合はボードごとに変える)
+#define BT_DEVICE_NAME "Esp32-tmk"
+
 BluetoothSerial SerialBT;
 
 uint8_t range[NUM_SENSOR];
@@ -49,10 +70,38 @@ VL6180X sensor[NUM_SENSOR];
 uint8_t pin[MAX_NUM_SENSOR] = { 4, 5, 12, 13, 14, 15, 16, 17, 18, 19 };
 uint8_t num[NUM_SENSOR];
 uint8_t offset_range[MAX_NUM_SENSOR] = { 13, 16, 19, 15, 251, 4, 26, 11, 14, 6 };
+uint8_t frame[FRAME_SIZE];
+uint16_t frame_seq = 0;
+
+// CRC-8 (多項式 0x07)
+uint8_t crc8(const uint8_t *data, size_t len) {
+  uint8_t crc = 0;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (uint8_t j = 0; j < 8; j++)
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+  }
+  return crc;
+}
+
+// range[] をバイナリのフレームにして送信
+void sendBinaryFrame(uint32_t timestamp) {
+  frame[0] = FRAME_SYNC;
+  frame[1] = frame_seq & 0xFF;
+  frame[2] = frame_seq >> 8;
+  for (uint8_t i = 0; i < 4; i++)
+    frame[3 + i] = (timestamp >> (8 * i)) & 0xFF;
+  frame[7] = NUM_SENSOR;
+  memcpy(frame + FRAME_HEADER_SIZE, range, NUM_SENSOR);
+  frame[FRAME_SIZE - 1] = crc8(frame + 1, FRAME_SIZE - 2);
+  SerialBT.write(frame, FRAME_SIZE);
+  Serial.write(frame, FRAME_SIZE);
+  frame_seq++;
+}
 
 void setup() {
   Serial.begin(115200);
-  SerialBT.begin("Esp32-tmk");
+  SerialBT.begin(BT_DEVICE_NAME);
   Wire.begin();
   // すでにアクティブな場合は、連続モードを停止する
   for (uint8_t i = 0; i < NUM_SENSOR; i++) {
@@ -127,6 +176,20 @@ void setup() {
 
 void loop() {
   unsigned long start = micros();
+  if (BINARY_FRAME_MODE) {
+    for (uint8_t i = HEAD_SENSOR; i <= TAIL_SENSOR; i++) {
+      range[i] = sensor[i].readRangeContinuousMillimeters();
+      if (sensor[i].timeoutOccurred())
+        range[i] = OUT_OF_RANGE_VALUE;
+    }
+    sendBinaryFrame(start);
+    return;
+  }
+  if (FRAME_INFO_OUTPUT) {
+    SerialBT.printf("@%u:%lu ", frame_seq, start);
+    Serial.printf("@%u:%lu ", frame_seq, start);
+  }
+  frame_seq++;
   for (uint8_t i = HEAD_SENSOR; i <= TAIL_SENSOR; i++) {
     range[i] = sensor[i].readRangeContinuousMillimeters();
     if (range[i] == 255 && OUT_OF_RANGE_OUTPUT) {
@@ -1,14 +1,23 @@
-import serial
 import numpy as np
 import time
 import logging
 import threading
-import matplotlib.pyplot as plt
-from scipy.optimize import minimize, LinearConstraint, Bounds, fsolve
-from scipy import signal
-from collections import deque, defaultdict
-from functools import wraps
-from matplotlib import patches
+from frame_codec import OUT_OF_RANGE
+from frame_source import SerialSource
+from frame_timing import ClockOffsetEstimator, SequenceTracker
+from frame_pipeline import LatestQueue, StageMetrics, run_stage
+from liner_frame import Frame
+from frame_history import FrameHistory
+from filter_bank import IIRFilterBank
+from finger_tracker import FingerTracker
+from circle_fit import fit_circle
+from segmentation import segment_frame, local_maxima
+from array_geometry import ArrayGeometry
+from circle_lut import CircleFitTable
+from solve_cache import SolveCache
+from instrumentation import registry, timed
+from telemetry import FrameTelemetry, RateLimitedLog
+from live_plot import LivePlot
 from sympy import (
     symbols,
     Eq,
@@ -24,41 +33,88 @@ from sympy import (
 logger = logging.getLogger(__name__)
 
 
-def timeit(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start = time.time()
-        result = func(*args, **kwargs)
-        end = time.time()
-        if end - start > 0.05:
-            logger.info(f"{func.__name__}: {end - start:.4f}秒")
-        return result
-
-    return wrapper
-
-
 class LinerTouch:
 
-    def __init__(self, update_callback=None, tap_callback=None, plot_graph=True):
-        # LinerTouchの変数なくてもどこからでもアクセスできるように
-        LinerTouch.liner = self
+    def __init__(
+        self,
+        update_callback=None,
+        tap_callback=None,
+        plot_graph=True,
+        binary_frame=False,
+        lookup_table=False,
+        source=None,
+        threaded=True,
+        frame_log=None,
+        geometry=None,
+    ):
         # LinerTouch が準備できたかを示す
         self.ready = False
-        self.ser = serial.Serial(port="COM9", baudrate=115200)
-        self.buffer_data = ""
-
-        self.sensor_num = 9
+        # フレームの入力元 (省略した場合は COM9 のシリアル通信)
+        # 記録したデータを使う場合は frame_source.CsvReplaySource などを渡す
+        # binary_frame は LinerTouch.ino の BINARY_FRAME_MODE と合わせる
+        # geometry にボードのシリアルポートを設定した場合はそれを開く
+        if source is None:
+            if geometry is not None and geometry.segments[0].port is not None:
+                source = geometry.open_source()
+            else:
+                source = SerialSource(
+                    port="COM9", baudrate=115200, binary_frame=binary_frame
+                )
+        self.source = source
+        # 受信したフレームを記録する (frame_source.FrameLogWriter)
+        self.frame_log = frame_log
+
+        # センサの並び (array_geometry.ArrayGeometry.load で設定ファイルから読む)
+        # 省略した場合は sensor_ratio 間隔に並べ、センサの数はフレームに合わせる
+        self.fixed_geometry = geometry is not None
+        self.sensor_num = 9 if geometry is None else geometry.sensor_num
         # 第2指遠位関節幅の半径(mm単位)
         self.finger_radius = 14.9 / 2
         # センサの高さに対しての一個あたりのセンサの横幅のサイズの倍率
         # センサの測定可能距離/センサの横幅=sensor_ratio
-        self.sensor_ratio = 10
+        self.sensor_ratio = 10 if geometry is None else geometry.sensor_ratio
+        if geometry is None:
+            geometry = ArrayGeometry.uniform(self.sensor_num, self.sensor_ratio)
+        self.geometry = geometry
+        # センサの数が設定と違うフレームの警告は1秒に1回だけ出力する
+        self.geometry_log = RateLimitedLog(logger)
         # センサの最大測定距離(mm単位)
         self.sensor_height = 100
+        # フレームの番号の欠落の検出 (欠落数は self.sequence.lost)
+        self.sequence = SequenceTracker()
+        # マイコンとホストの時刻の差の推定
+        self.clock = ClockOffsetEstimator()
+        # 最新の処理済みのフレーム (処理が終わるたびに置き換える)
+        self.frame = Frame(range_data=[], estimated_data=[])
         # 指のタッチ時間の閾値(sec単位)
         self.release_threshold = 0.5
         # 保存するデータの数
         self.past_data_num = 10
+        # 前のフレームの推定位置から最適化を始めるか
+        self.warm_start = True
+        # 前のフレームの推定位置を初期値に使うデータ郡の中心からの距離(mm単位)
+        self.warm_start_gate = 2 * self.sensor_ratio
+        # 初期値での誤差がこの値以下なら最適化を省略する(mm単位)
+        self.warm_start_tol = 0.5
+        # 推定スレッドで求めた前のフレームの推定位置
+        self.last_estimated_data = []
+        # 推定の前にセンサの値をローパスフィルタに通すか
+        self.smoothing = False
+        # センサごとの状態を持つローパスフィルタ (センサ数は最初のフレームで合わせる)
+        self.filter_bank = IIRFilterBank(self.sensor_num)
+        # データ郡ごとの推定結果のキャッシュ (solve_cache.stats() でヒット率を確認できる)
+        # 同じ指が止まっている間は同じデータ郡が続くため解き直さない
+        # quantum (mm) を指定すると近い測定値の結果も使い回す
+        self.solve_cache = SolveCache(maxsize=256, quantum=None)
+        # センサが1, 2個のデータ郡は事前に計算した表から推定位置を引く
+        # (初回は表を作って data に保存するため数秒かかる)
+        self.lookup_table = None
+        # 表を作った後に指の半径などを変えた場合の警告は1秒に1回だけ出力する
+        self.lookup_table_log = RateLimitedLog(logger)
+        if lookup_table:
+            self.lookup_table = CircleFitTable(
+                self.finger_radius, self.sensor_ratio, self.sensor_height
+            )
 
         # グラフを描画するかしないか
         self.plot_graph = plot_graph
@@ -74,124 +130,254 @@ class LinerTouch:
         self.pinch_motion_callback = None
         self.pinch_update_callback = None
         self.plot_data_thread = None
-        self.ax = None
-        self.past_data = {
-            "estimated_data": deque(maxlen=self.past_data_num),
-            "actual_data": deque(maxlen=self.past_data_num),
-            "len": 0,
+        self.live_plot = None
+        # グラフを更新する最大の頻度 (回/秒)
+        self.plot_fps = 30
+        # 新しいフレームを公開したことをグラフのスレッドに知らせる
+        self.frame_ready = threading.Event()
+        # フレームごとの測定値と推定位置の記録 (telemetry.attach(logger.info) で出力する)
+        self.telemetry = FrameTelemetry()
+        # 最適化の失敗は1秒に1回だけ出力する
+        self.solve_failure_log = RateLimitedLog(logger)
+        # 指ごとに番号を付けて追跡する
+        self.tracker = FingerTracker()
+        # 過去のフレームの測定値と推定位置 (NaN は OoR または指が無い)
+        self.history = FrameHistory(self.past_data_num)
+        # 読み込み → 推定 → コールバックの各スレッドをつなぐキュー
+        # 推定が遅れた場合は最新のフレームだけ推定する
+        self.frame_queue = LatestQueue(maxlen=1)
+        # コールバックが遅れた場合は古いものから捨て、読み込みを止めない
+        self.event_queue = LatestQueue(maxlen=self.past_data_num)
+        # 段ごとの処理時間とキューの深さ (get_metrics で取得)
+        self.metrics = {
+            "read": StageMetrics(),
+            "estimate": StageMetrics(),
+            "dispatch": StageMetrics(),
         }
-        threading.Thread(target=self.update_get_data).start()
+        # 入力元が終わった後, 各段はキューを空にしてから終了する
+        self.read_finished = threading.Event()
+        self.estimate_finished = threading.Event()
+        # threaded=False の場合はスレッドを起動しないため run() か get_data() を呼ぶ
+        if threaded:
+            threading.Thread(target=self.update_get_data).start()
+            threading.Thread(target=self.update_estimate).start()
+            threading.Thread(target=self.update_dispatch).start()
         if self.plot_graph:
             threading.Thread(target=self.update_plot_data).start()
 
+    # 読み込みスレッド
+    # 最新のフレームの値
+    # 別のスレッドから複数の値を読む場合は self.frame を一度取り出して使う
+    @property
+    def range_data(self):
+        return self.frame.range_data
+
+    @property
+    def estimated_data(self):
+        return self.frame.estimated_data
+
+    @property
+    def seq(self):
+        return self.frame.seq
+
+    @property
+    def device_time(self):
+        return self.frame.device_time
+
+    @property
+    def host_time(self):
+        return self.frame.host_time
+
+    @property
+    def frame_time(self):
+        return self.frame.frame_time
+
     def update_get_data(self):
 
-        self.ser.reset_input_buffer()
-        while True:
+        self.source.reset()
+        while not self.source.finished:
             try:
-                self.get_data()
+                frame = self.read_frame()
+                if frame is None:
+                    continue
+                read_time = time.perf_counter()
+                self.frame_queue.put((frame, read_time))
+                # 次のデータを待つ時間を含めず、データが届いてからの処理時間を記録する
+                self.metrics["read"].record(self.source.received_time, read_time)
             except KeyboardInterrupt:
                 break
-        self.ser.close()
-
+        self.source.close()
+        self.read_finished.set()
+
+    # 推定スレッド
+    def update_estimate(self):
+        def handler(frame, read_time):
+            self.event_queue.put((self.estimate_frame(frame), read_time))
+
+        while not (self.read_finished.is_set() and len(self.frame_queue) == 0):
+            run_stage(self.frame_queue, handler, self.metrics["estimate"])
+        self.estimate_finished.set()
+
+    # コールバックを呼ぶスレッド
+    def update_dispatch(self):
+        def handler(data, read_time):
+            self.dispatch_frame(data)
+
+        while not (self.estimate_finished.is_set() and len(self.event_queue) == 0):
+            run_stage(self.event_queue, handler, self.metrics["dispatch"])
+
+    def get_metrics(self):
+        metrics = {key: value.snapshot() for key, value in self.metrics.items()}
+        metrics["read"]["dropped"] = self.source.dropped
+        metrics["estimate"]["dropped"] = self.frame_queue.dropped
+        metrics["dispatch"]["dropped"] = self.event_queue.dropped
+        metrics["solve_cache"] = self.solve_cache.stats()
+        # 関数ごとの処理時間 (ns) の分布と最適化の反復回数, 失敗回数
+        metrics["instrumentation"] = registry.snapshot()
+        return metrics
+
+    # 読み込みから推定, コールバックまでを同じスレッドで行う
     def get_data(self):
-        if self.ser.in_waiting > 0:  # 読み込めるデータがあるかを確認
-            self.buffer_data += self.ser.read(self.ser.in_waiting).decode("utf-8")
-            split = self.buffer_data.split("\r\n")
-            # コンマはセンサ側のオフセットの処理なので次回へ
-
-            # 改行があればデータが完成しているため行を完成させ後ろの行はbuffer_dataに追加
-            if len(split) >= 2:
-                if len(split) >= 3:
-                    logger.error("サンプリングレートに間に合ってない")
-                if "," in split[-1] or "," in split[-2]:
-                    return
-                raw_data = split[-2]
-                self.buffer_data = split[-1]
-            # 改行コードが無ければデータが未完成のためbuffer_dataに追加して次回へ
-            else:
-                return
-
-            # スペースで区切ってデータをリストに変換
-            raw_data_list = raw_data.split()
-            self.sensor_num = len(raw_data_list)
-            self.estimated_data = []
-            # データを二次元配列の形式に整える（[インデックス, 数値] の順）
-            self.range_data = [
-                [idx * self.sensor_ratio, int(value)]
-                for idx, value in enumerate(raw_data_list)
-                if value.isdigit()
-            ]
-            logger.info(self.range_data)
-            # データがある場合
-            if len(self.range_data) > 0:
-                # data = self.smoothing_filter()
-                self.split_x_data(self.range_data)
-
-                for data in self.estimated_data:
-                    logger.info(f"est_pos:{data[0]:.0f},{data[1]:.0f}")
-
-                # LinerTouch が準備できたことを示す
-                self.ready = True
-            # データがすべてOoRの場合
-            else:
-                pass
-            if self.ready:
-                # 更新コールバック
-                if self.update_callback:
-                    self.update_callback()
-                if self.get_pastdata("len") == self.past_data_num:
-                    # タッチ検出処理
-                    self.get_touch()
-                    self.get_pinch()
-            self.prev_range_data = self.range_data
-            self.add_pastdata(
-                estimated_data=self.estimated_data, actual_data=self.range_data
+        frame = self.read_frame()
+        if frame is None:
+            return
+        self.update_data(frame)
+
+    # 入力元が終わるまで get_data を繰り返す (threaded=False で記録したデータを再生する場合)
+    # 読み込みを待たせないため、速度を指定しない再生でもフレームを読み飛ばさない
+    def run(self):
+        self.source.reset()
+        while not self.source.finished:
+            self.get_data()
+        self.source.close()
+
+    # 入力元から1フレーム (RawFrame) を読む
+    def read_frame(self):
+        return self.record_frame(self.source.read_frame())
+
+    # 受信したフレームを frame_log に記録する (DeviceManager が読んだフレームも通す)
+    def record_frame(self, frame):
+        if frame is not None and self.frame_log is not None:
+            host_time = frame.host_time if frame.host_time is not None else time.time()
+            self.frame_log.write(frame, host_time)
+        return frame
+
+    def update_data(self, frame):
+        self.dispatch_frame(self.estimate_frame(frame))
+
+    # フレームの番号と時刻を求める
+    def get_frame_time(self, frame):
+        # 再生したフレームは記録時の間隔に合わせた受信時刻を持つ
+        host_time = frame.host_time if frame.host_time is not None else time.time()
+        if frame.seq is not None:
+            self.sequence.update(frame.seq)
+        # マイコンの時刻が無い場合はホストの受信時刻を使う
+        if frame.timestamp is None:
+            return None, host_time, host_time
+        device_time = self.clock.unwrap(frame.timestamp)
+        self.clock.update(device_time, host_time)
+        return device_time, host_time, self.clock.to_host_time(device_time)
+
+    # フレームから指の位置を推定する (推定スレッド)
+    def estimate_frame(self, frame):
+        device_time, host_time, frame_time = self.get_frame_time(frame)
+        ranges = self.fit_geometry(frame.ranges)
+        detected = ranges != OUT_OF_RANGE
+        # データを二次元配列の形式に整える（[x 座標, 数値] の順）
+        range_data = [
+            [x, r]
+            for x, r in zip(
+                self.geometry.sensor_x[detected].tolist(), ranges[detected].tolist()
             )
-
-        # シリアル通信のバッファにデータがない場合
+        ]
+        # フィルタは OoR のフレームでも状態を進める
+        if self.smoothing:
+            values = self.smoothing_filter(ranges)
         else:
-            pass
-
-    # 追加のタイミングが一フレーム遅い
-    # estimated_posを求める
-    @timeit
-    def smoothing_filter(self):
-        if self.get_pastdata("len") == self.past_data_num:
-            buf = {}
-            for data1 in self.range_data:
-                buf[str(data1[0])] = [data1[1]]
-            for data1 in self.get_pastdata("actual_data").copy():
-                for data2 in data1:
-                    key = str(data2[0])
-                    if key in buf:
-                        buf[key].append(data2[1])
-                    # バターワースフィルタの設計
-            result = []
-            for data1 in buf:
-                sos = signal.butter(4, 10, "lp", fs=50, output="sos")
-                filtered = signal.sosfilt(sos, np.array(buf[data1]))
-                result.append([int(data1), float(filtered[0])])
+            values = np.where(detected, ranges, np.nan)
+        # データがある場合
+        if not np.isnan(values).all():
+            estimated_data = self.split_x_data(values)
+        # データがすべてOoRの場合
         else:
-            result = self.range_data
-        return result
-
-    def get_pastdata(self, key: str):
-        if self.past_data is None:
-            pass
-        return self.past_data[key]
+            estimated_data = []
+        self.last_estimated_data = estimated_data
+        # 推定位置を前のフレームまでの指に対応付ける
+        tracks = self.tracker.update(estimated_data, frame_time)
+        # 公開した後に書き換えられないように
+        ranges.flags.writeable = False
+        return Frame(
+            seq=frame.seq,
+            device_time=device_time,
+            host_time=host_time,
+            frame_time=frame_time,
+            ranges=ranges,
+            range_data=range_data,
+            estimated_data=estimated_data,
+            tap_flag=self.tap_flag,
+            pinch_dist=self.pinch_dist,
+            tracks=tracks,
+        )
 
-    @timeit
-    def add_pastdata(
-        self,
-        estimated_data: list[list[int]] = None,
-        actual_data: list[list[int]] = None,
-    ) -> None:
-        if estimated_data is not None:
-            self.past_data["estimated_data"].appendleft(estimated_data.copy())
-        if actual_data is not None:
-            self.past_data["actual_data"].appendleft(actual_data.copy())
-        self.past_data["len"] = len(self.past_data["estimated_data"])
+    # フレームのセンサの数をセンサの並びに合わせる
+    def fit_geometry(self, ranges):
+        geometry = self.geometry
+        if self.fixed_geometry:
+            if len(ranges) != geometry.sensor_num:
+                self.geometry_log.warning(
+                    "センサの数が設定と違う: %d (設定は %d)",
+                    len(ranges),
+                    geometry.sensor_num,
+                )
+                # 足りないセンサは OoR で埋め、多いセンサは使わない
+                fitted = np.full(geometry.sensor_num, OUT_OF_RANGE, dtype=np.uint8)
+                count = min(len(ranges), geometry.sensor_num)
+                fitted[:count] = ranges[:count]
+                ranges = fitted
+            return ranges
+        if (len(ranges), self.sensor_ratio) != (
+            geometry.sensor_num,
+            geometry.sensor_ratio,
+        ):
+            self.geometry = ArrayGeometry.uniform(len(ranges), self.sensor_ratio)
+            self.sensor_num = len(ranges)
+            # センサの並びが変わると範囲が変わるためキャッシュした結果は使えない
+            self.solve_cache.clear()
+        return ranges
+
+    # 推定結果を公開してコールバックとジェスチャの検出を行う (コールバックのスレッド)
+    def dispatch_frame(self, frame):
+        self.frame = frame
+        if len(self.range_data) > 0:
+            # LinerTouch が準備できたことを示す
+            self.ready = True
+        if self.ready:
+            # 更新コールバック
+            if self.update_callback:
+                self.update_callback()
+            if len(self.history) == self.past_data_num:
+                # タッチ検出処理
+                self.get_touch()
+                self.get_pinch()
+                # ジェスチャの状態を反映したフレームに置き換える
+                self.frame = self.frame.replace(
+                    tap_flag=self.tap_flag, pinch_dist=self.pinch_dist
+                )
+        self.prev_range_data = self.range_data
+        self.add_pastdata(self.frame)
+        # ログは sink を登録した場合だけ別のスレッドで書き出す
+        self.telemetry.record(self.frame)
+        self.frame_ready.set()
+
+    # センサの値をローパスフィルタに通して返す (未検知のセンサは NaN)
+    @timed()
+    def smoothing_filter(self, ranges):
+        ranges = np.where(ranges == OUT_OF_RANGE, np.nan, ranges)
+        return self.filter_bank.update(ranges)
+
+    @timed()
+    def add_pastdata(self, frame) -> None:
+        self.history.append(frame.ranges, frame.estimated_data, frame.frame_time)
 
     # 指の本数を推測し最も誤差が少ない推定位置を利用
     # @timeit
@@ -248,211 +434,189 @@ class LinerTouch:
     #         center = self.lr_min_inv(range_data)
     #         self.estimated_data.append(center.x.tolist())
 
-    @timeit
-    def split_finger_data(self, range_data):
-        # 指の極大値を格納
-        range_data_np = np.array(range_data)
+    @timed()
+    def split_finger_data(self, range_data, max_idx=None):
+        """
+        range_data: データ郡の [x, 測定値] の配列
+        max_idx: データ郡の中の極大値の位置 (省略時は range_data から求める)
+        """
         if len(range_data) < 2:
-            return
-        max_idx = []
-        range_x = range_data_np[:, 0]  # 1列目
-        range_r = range_data_np[:, 1]  # 2列目
-        for i in range(1, len(range_data) - 1):
-            if range_r[i - 1] < range_r[i] > range_r[i + 1]:
-                max_idx.append(i)
-
-        self.min_err = None
-        self.min_left = None
-        self.min_right = None
-        self.count = 0
-
-        def store_min(idx):
-            # split_finger_dataの変数にアクセスできるように
-            left = self.filter_inv_solve(range_data[:idx])
-            right = self.filter_inv_solve(range_data[idx:])
-            # 計算成功していなければ終了
-            # if not left.success or not right.success:
-            # return
-            # 値が無ければ比較無しで代入
-            if not self.min_err:
-                self.min_left = left
-                self.min_right = right
-                return
-            # 現状の最小値と比較し現状以下のものがあれば更新
-            err = left.fun + right.fun
-            if err < self.min_err:
-                self.min_left = left
-                self.min_right = right
-            logger.info(self.count)
-            return
+            return []
+        # 指の極大値
+        if max_idx is None:
+            max_idx = local_maxima(np.asarray(range_data)[:, 1])
 
         if len(max_idx) > 0:
-            for idx in max_idx:
+            # 極大値を左に振り分ける場合と右に振り分ける場合をすべて並べて解く
+            split_idx = []
+            for idx in max_idx.tolist():
                 # 左に振り分け
-                store_min(idx + 1)
+                split_idx.append(idx + 1)
                 # 右に振り分け
-                store_min(idx)
-            # if not min_err:
-            #     logger.error("計算失敗してて草")
-            #     raise AttributeError("計算失敗してて草")
-            self.estimated_data.append(self.min_left.x.tolist())
-            self.estimated_data.append(self.min_right.x.tolist())
+                split_idx.append(idx)
+            subsets = []
+            for idx in split_idx:
+                subsets.append(range_data[:idx])
+                subsets.append(range_data[idx:])
+            results = self.filter_inv_solve_batch(subsets)
+            # 左右の誤差の和が最小の分け方を利用
+            err = [
+                results[2 * i].fun + results[2 * i + 1].fun
+                for i in range(len(split_idx))
+            ]
+            min_i = int(np.argmin(err))
+            return [results[2 * min_i].x.tolist(), results[2 * min_i + 1].x.tolist()]
 
         else:
             center = self.lr_min_inv(range_data)
-            self.estimated_data.append(center.x.tolist())
+            return [center.x.tolist()]
 
     # 左右のセンサが最短距離でない場合、含めると誤差が大きくなるため少なくなるように
     def lr_min_inv(self, range_data):
         if len(range_data) <= 3:
             result = self.filter_inv_solve(range_data)
             return result
-        inv_list = []
-        # 左右どちらも除かない
-        inv_list.append(self.filter_inv_solve(range_data))
-        # 左を除く
-        inv_list.append(self.filter_inv_solve(range_data[1:]))
-        # 右を除く
-        inv_list.append(self.filter_inv_solve(range_data[:-1]))
-        if len(range_data) > 4:
-            inv_list.append(self.filter_inv_solve(range_data[1:-1]))
+        inv_list = self.filter_inv_solve_batch(self.lr_subsets(range_data))
+        return min(inv_list, key=lambda data: data.fun)
 
-        min_fun = min([data.fun for data in inv_list])
-        for data in inv_list:
-            if data.fun == min_fun:
-                return data
-
-        raise ValueError("一致する誤差値がない")
+    # lr_min_invで比較する左右を除いたデータ
+    def lr_subsets(self, range_data):
+        if len(range_data) <= 3:
+            return [range_data]
+        # 左右どちらも除かない, 左を除く, 右を除く
+        subsets = [range_data, range_data[1:], range_data[:-1]]
+        if len(range_data) > 4:
+            subsets.append(range_data[1:-1])
+        return subsets
 
-    @timeit
-    # 逆問題による推測
-    def filter_inv_solve(self, range_data, left=False, right=False):
-        # 観測値が1個の場合、観測値から指の半径から推測
-        range_data_np = np.array(range_data)
-        range_x = range_data_np[:, 0]  # 1列目
-        range_r = range_data_np[:, 1]  # 2列目
-        min_r = min(range_r)
-        range_data = [
-            [x, r]
-            for x, r in range_data
-            if r
-            <= min_r + self.sensor_ratio + self.finger_radius * (len(range_data) / 2)
-        ]
+    # 最短距離から離れすぎているセンサを除く
+    def filter_range_data(self, range_data):
         range_data_np = np.array(range_data)
         range_x = range_data_np[:, 0]  # 1列目
         range_r = range_data_np[:, 1]  # 2列目
+        limit = (
+            range_r.min()
+            + self.sensor_ratio
+            + self.finger_radius * (len(range_data) / 2)
+        )
+        keep = range_r <= limit
+        return range_x[keep], range_r[keep]
 
-        r = self.finger_radius  # rの値
-        e = 0  # riの誤差
-
-        # 誤差関数
-        # def error(params):
-        #     x, y = params
-        #     sum_squared_error = 0
-        #     for i in range(len(range_data)):
-        #         err_list = []
-        #         for r_err in range(-e, e + 1):  # 誤差を考慮
-        #             xi = range_x[i]
-        #             ri = range_r[i] + r_err
-        #             error = (np.sqrt((x - xi) ** 2 + y**2) )- (np.sqrt((ri + r) ** 2))
-        #             err_list.append(error**2)
-        #         sum_squared_error += min(err_list)
-        #         return np.sqrt(sum_squared_error / len(range_data))
-        def error(params):
-            x, y = params
-            sum_squared_error = 0
-            for i in range(len(range_data)):
-                xi = range_x[i]
-                ri = range_r[i]
-                error = (np.sqrt((x - xi) ** 2 + y**2)) - (np.sqrt((ri + r) ** 2))
-            sum_squared_error += error**2
-            return np.sqrt(sum_squared_error / len(range_data))
-
-        # 制約関数
-        # 検知できなかったセンサ範囲を除く制約関数
-        # 左からの制約
-        def left_constraint(params):
-            x, y = params
-            return (
-                (y * (-np.tan(12.5 * np.pi / 180)))
-                - (min(range_x) - self.sensor_ratio)
-                + x
-            )
+    # 入力領域外を除く範囲
+    def solve_bounds(self):
+        return [
+            self.geometry.x_bounds(),
+            (0, self.sensor_height),
+        ]
 
-        # 右からの制約
-        def right_constraint(params):
-            x, y = params
-            return (
-                (y * (np.tan(-12.5 * np.pi / 180)))
-                + (max(range_x) + self.sensor_ratio)
-                - x
-            )
+    # データ郡に最も近い前のフレームの推定位置 (無ければ None)
+    # history はコールバックのスレッドで更新するため推定スレッドで保持したものを使う
+    def warm_start_guess(self, range_x):
+        if not self.warm_start or not self.last_estimated_data:
+            return None
+        center = np.mean(range_x)
+        pos = min(self.last_estimated_data, key=lambda pos: abs(pos[0] - center))
+        if abs(pos[0] - center) > self.warm_start_gate:
+            return None
+        return pos
 
-        constraints = []
-        if left:
-            constraints.append({"type": "ineq", "fun": left_constraint})
-        if right:
-            constraints.append({"type": "ineq", "fun": right_constraint})
+    # 推定結果のキャッシュのキー (実行中に指の半径やセンサの高さを変えた場合は解き直す)
+    def solve_cache_key(self, range_data):
+        return self.solve_cache.key(
+            range_data, (self.finger_radius, self.sensor_ratio, self.sensor_height)
+        )
 
-        # 入力領域外を除く制約関数
+    @timed()
+    # 逆問題による推測
+    def filter_inv_solve(self, range_data, left=False, right=False):
+        key = self.solve_cache_key(range_data)
+        result = self.solve_cache.get(key)
+        if result is not None:
+            return result
+        # 観測値が1個の場合、観測値から指の半径から推測
+        range_x, range_r = self.filter_range_data(range_data)
 
-        bounds = [
-            (0, self.sensor_num * self.sensor_ratio),
-            (0, self.sensor_height),
-        ]
-        # 初期値 (観測点の中心を使用)
-        # rd = int(len(range_data) / 2)
-        # initial_guess = self.calculate_intersections(range_data[rd : rd + 2])
-        # if initial_guess == None:
-        #     initial_guess = [np.mean(range_x), np.mean(range_r)]
-        # else:
-        #     pass
-        initial_guess = [np.mean(range_x), np.mean(range_r)]
-
-        # 最適化
-        result = minimize(
-            error,
-            initial_guess,
-            bounds=bounds,
-            # constraints=constraints,
-            method="SLSQP",
+        result = self.lookup_solve(range_x, range_r)
+        if result is not None:
+            return result
+        # 線形最小二乗の初期値からガウス・ニュートン法で求める
+        # (SLSQP を毎回呼ぶとフレームあたりの処理時間を超えるため)
+        # left, right の制約は現状使っていない
+        result = fit_circle(
+            range_x,
+            range_r,
+            self.finger_radius,
+            self.solve_bounds(),
+            initial_guess=self.warm_start_guess(range_x),
+            warm_tol=self.warm_start_tol,
         )
         result.range_x = range_x
-        if not result.success:
-            logger.error("解けない" + result.message)
+        self.record_solve(result)
+        self.solve_cache.put(key, result)
 
-        # if result.fun == 0:
-        #     logger.error("誤差0" + result.message)
-        # else:
-        #     logger.info(result.x)
-        #     logger.info(result.fun)
+        return result
 
+    # 最適化の反復回数と失敗した回数を記録する
+    def record_solve(self, result):
+        registry.count("solver.solves")
+        registry.record("solver.iterations", result.nit)
+        if not result.success:
+            registry.count("solver.failures")
+            self.solve_failure_log.warning("解けない %s", result.message)
+
+    # 表から推定位置を引く (表が無いか表に無いデータ郡の場合は None)
+    def lookup_solve(self, range_x, range_r):
+        if self.lookup_table is None:
+            return None
+        # 表を作った時と値が違う場合は表を使わずに解く
+        if not self.lookup_table.matches(
+            self.finger_radius, self.sensor_ratio, self.sensor_height
+        ):
+            self.lookup_table_log.warning(
+                "指の半径, センサの間隔, 高さが表と違うため表を使わない: %s",
+                self.lookup_table.path,
+            )
+            return None
+        result = self.lookup_table.lookup(range_x, range_r, self.solve_bounds())
+        if result is not None:
+            result.range_x = range_x
         return result
 
+    @timed()
+    # 複数の仮説 (range_dataの部分集合) を1つずつ逆問題で推測
+    # (フレームあたりの仮説は多くて十数個のため、まとめて解いても速くならない)
+    def filter_inv_solve_batch(self, range_data_list):
+        return [self.filter_inv_solve(data) for data in range_data_list]
+
     # センサのデータを未検知のセンサごとに分割
-    @timeit
-    def split_x_data(self, range_data):
-        result = []
-        temp_list = []  # 初期化を空リストに変更
-        prev_x = range_data[0][0]
-        for i in range(len(range_data)):
-            x, y = range_data[i]
-            if i > 0 and x - prev_x > self.sensor_ratio:
-                result.append(temp_list)
-                temp_list = []  # 新しいリストを作成
-            temp_list.append([x, y])  # temp_list に要素を追加
-            prev_x = x
-
-        if temp_list:  # 最後の temp_list を result に追加
-            result.append(temp_list)
+    @timed()
+    def split_x_data(self, values):
+        """
+        values: センサごとの測定値 ((sensor_num,) の ndarray, 未検知は NaN)
+        データ郡はコピーせず [x, 測定値] の配列の区間 (ビュー) として渡す。
+        """
+        # データ郡ごとに解くため、推定の処理はセンサの数でなく指の数で決まる
+        spans, peaks = segment_frame(values, self.geometry.breaks)
+        points = np.column_stack((self.geometry.sensor_x, values))
         # データ郡が1弧の場合
-        if len(result) < 2:
-            self.split_finger_data(result[0])
+        if len(spans) < 2:
+            start, stop = spans[0]
+            return self.split_finger_data(points[start:stop], peaks - start)
         # データ郡が2弧(以上)の場合
         else:
-            for data in result:
-                pos = self.lr_min_inv(data)
-                self.estimated_data.append(pos.x.tolist())
+            # すべてのデータ郡の候補を解き、データ郡ごとに誤差が最小のものを利用
+            subsets = [self.lr_subsets(points[start:stop]) for start, stop in spans]
+            inv_list = self.filter_inv_solve_batch(
+                [data for subset in subsets for data in subset]
+            )
+            estimated_data = []
+            start = 0
+            for subset in subsets:
+                group = inv_list[start : start + len(subset)]
+                start += len(subset)
+                pos = min(group, key=lambda data: data.fun)
+                estimated_data.append(pos.x.tolist())
+            return estimated_data
 
     def update_plot_data(self):
         time.sleep(1)
@@ -462,90 +626,40 @@ class LinerTouch:
             except KeyboardInterrupt:
                 break
 
+    # 新しいフレームが届いたらグラフを更新する (plot_fps 回/秒まで)
     def plot_data(self):
-        if self.ready:
-            if self.ax is None:
-                """
-                matplotlibのグラフを初期化する関数。
-                """
-                self.fig, self.ax = plt.subplots()
-                self.ax.set_aspect("equal")
-                self.ax.set_xlim(
-                    -self.sensor_ratio, self.sensor_num * self.sensor_ratio
-                )
-                self.ax.set_ylim(0, self.sensor_height)
-                self.ax.set_xlabel("X")
-                self.ax.set_ylabel("Y")
-                self.ax.set_title("Sensor Data, Estimated Position, and Arcs")
-                plt.ion()  # 対話モードをオン
-                plt.show()
-            else:
-                """
-                センサーデータ、推定位置、および円弧をプロットする関数。
-                """
-                self.ax.clear()
-
-                # センサーデータのプロット
-                x_vals = [data[0] for data in self.range_data]
-                y_vals = [data[1] for data in self.range_data]
-                self.ax.scatter(x_vals, y_vals, color="blue", label="Sensor Data")
-
-                # 円弧のプロット
-                angle_range = [(90 - 12.5) / 180 * np.pi, (90 + 12.5) / 180 * np.pi]
-                for i in range(len(self.range_data)):
-                    x0, r0 = self.range_data[i]
-                    r0 += self.finger_radius
-                    # 円弧の描画
-                    arc0 = patches.Arc(
-                        (x0, 0),
-                        2 * r0,
-                        2 * r0,
-                        theta1=np.degrees(angle_range[0]),
-                        theta2=np.degrees(angle_range[1]),
-                        edgecolor="green",
-                        linestyle="--",
-                    )
-                    self.ax.add_patch(arc0)
-
-                # 推定位置のプロット
-                for estimated_pos in self.estimated_data:
-                    self.ax.scatter(
-                        estimated_pos[0],
-                        estimated_pos[1],
-                        color="red",
-                        label=(
-                            "Estimated Position (Intersection)"
-                            if "Estimated Position (Intersection)"
-                            not in [l.get_label() for l in self.ax.get_lines()]
-                            else ""
-                        ),
-                    )
-
-                # グラフの設定
-                self.ax.set_aspect("equal")
-                self.ax.set_xlim(
-                    -self.sensor_ratio, self.sensor_num * self.sensor_ratio
-                )
-                self.ax.set_ylim(0, self.sensor_height)
-                self.ax.legend()
-
-                # 描画を更新
-                self.fig.canvas.draw()
-                self.fig.canvas.flush_events()
+        if not self.frame_ready.wait(timeout=1.0) or not self.ready:
+            return
+        start = time.perf_counter()
+        self.frame_ready.clear()
+        x_bounds = self.geometry.x_bounds()
+        if self.live_plot is None:
+            self.live_plot = LivePlot(
+                x_bounds,
+                self.sensor_ratio,
+                self.sensor_height,
+                self.finger_radius,
+            )
+        elif self.live_plot.x_bounds != x_bounds:
+            self.live_plot.set_x_bounds(x_bounds)
+        # 描画中にフレームが置き換わっても同じフレームの値を使う
+        self.live_plot.update(self.frame)
+        time.sleep(max(1 / self.plot_fps - (time.perf_counter() - start), 0))
 
-    @timeit
+    @timed()
     # 指のタッチ検知
     def get_touch(self):
         if self.tap_callback != None:
             # 指のリリース
-            now_time = time.time()
-            now_range_data = self.range_data
-            prev_range_data = self.get_pastdata("actual_data")[0]
+            # 通信の揺らぎを含まないセンサの取得時刻を使う
+            now_time = self.frame_time
+            now_in_range = len(self.range_data) > 0
+            prev_in_range = self.history.has_range(0)
             # タップのフラグがある場合
             if self.tap_flag:
-                self.estimated_data = self.hold_data  # .copy()
+                self.frame = self.frame.replace(estimated_data=self.hold_data)
                 # if  now_range_data and not prev_range_data:
-                if now_range_data != []:
+                if now_in_range:
                     self.tap_flag = False
                     logger.info("タッチ")
                     # 冗長な条件式
@@ -556,9 +670,9 @@ class LinerTouch:
                     self.tap_flag = False
             # タップのフラグがない場合
             else:
-                if now_range_data == [] and prev_range_data != []:
+                if not now_in_range and prev_in_range:
                     self.hold_start = now_time
-                    past_estimated_data = self.get_pastdata("estimated_data")[1]
+                    past_estimated_data = self.history.estimated_data(1)
                     if len(past_estimated_data) != 1:
                         logger.error("過去の推測値データの要素数がヘン")
                         return
@@ -566,18 +680,18 @@ class LinerTouch:
                     logger.info("リリース")
                     self.tap_flag = True
 
-    @timeit
+    @timed()
     # 指のピンチ検知
     def get_pinch(self):
         if self.pinch_update_callback != None:
             if len(self.estimated_data) == 2:
                 now_estimated_data = self.estimated_data
-                past_estimated_data = self.get_pastdata("estimated_data")[0]
+                past_finger_count = self.history.finger_count(0)
                 # ピンチ開始時の処理
                 if (
                     self.pinch_dist == None
                     or len(now_estimated_data) == 2
-                    and len(past_estimated_data) != 2
+                    and past_finger_count != 2
                 ):
                     self.pinch_dist = LinerTouch.get_euclid_dist(now_estimated_data)
                     self.center_pos = LinerTouch.get_mid_pos(now_estimated_data)
@@ -593,8 +707,7 @@ class LinerTouch:
                     self.pinch_motion_callback()
                     self.pinch_dist = now_dist
             else:
-                past_estimated_data = self.get_pastdata("estimated_data")[0]
-                if len(past_estimated_data) == 2:
+                if self.history.finger_count(0) == 2:
                     self.pinch_end_callback()
 
     def get_euclid_dist(data):
@@ -673,4 +786,5 @@ if __name__ == "__main__":
         format="[%(levelname)s] %(name)s:%(lineno)d:%(message)s",  # フォーマットの設定
     )
     liner_touch = LinerTouch()
+    liner_touch.telemetry.attach(logger.info)
     # liner_touch.update_callback = liner_touch.display_data
@@ -90,6 +90,9 @@ class LinerTouch:
 
                 # スペースで区切ってデータをリストに変換
                 raw_data_list = raw_data.split()
+                # 先頭の "@<seq>:<micros>" (FRAME_INFO_OUTPUT) はセンサの値ではないので除く
+                if raw_data_list and raw_data_list[0].startswith("@"):
+                    raw_data_list = raw_data_list[1:]
                 self.sensor_num = len(raw_data_list)
                 self.estimated_data = []
                 # データを二次元配列の形式に整える（[インデックス, 数値] の順）
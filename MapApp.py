@@ -6,6 +6,7 @@ from PIL import Image, ImageTk
 
 # LinerTouch クラスをインポート（同じフォルダ内に LinerTouch.py がある想定）
 from LinerTouch import LinerTouch
+from tk_bridge import TkCallbackBridge
 
 logger = logging.getLogger(__name__)
 
@@ -44,20 +45,29 @@ class MapApp:
         )
         self.canvas.pack()
 
+        # コールバックは LinerTouch のスレッドで呼ばれるため、
+        # Tk のメインループに渡して実行する
+        self.tk_bridge = TkCallbackBridge(master)
+        post = self.tk_bridge.post
+
         # LinerTouch のインスタンス作成
         #   - plot_graph=False: センサの生データなどの matplotlib 表示をオフ
         #   - update_callback: センサの推定座標が更新されるたびに呼ばれる関数
+        #     (画面の更新ごとに最新の1回だけ実行する)
         #   - tap_callback: タップ検出時のコールバック（用途に応じて実装可）
         self.liner = LinerTouch(
-            update_callback=self.on_update,   # フレームごとの更新
-            tap_callback=self.on_tap,         # （必要に応じて使用）
+            update_callback=self.tk_bridge.coalesce(self.on_update),   # フレームごとの更新
+            tap_callback=post(self.on_tap),         # （必要に応じて使用）
             plot_graph=False
         )
         # ピンチのコールバック
-        self.liner.pinch_start_callback = self.on_pinch_start
-        self.liner.pinch_motion_callback = self.on_pinch_motion
-        self.liner.pinch_update_callback = self.on_pinch_update
-        self.liner.pinch_end_callback = self.on_pinch_end
+        # メインループで実行する時には次のフレームに進んでいるため、
+        # 呼ばれた時点のフレーム (liner.frame) を先頭の引数で渡す
+        frame = lambda: self.liner.frame
+        self.liner.pinch_start_callback = post(self.on_pinch_start, frame)
+        self.liner.pinch_motion_callback = post(self.on_pinch_motion, frame)
+        self.liner.pinch_update_callback = post(self.on_pinch_update, frame)
+        self.liner.pinch_end_callback = post(self.on_pinch_end, frame)
 
         # 1本指ドラッグ用：最後の指位置を記録
         self.last_single_finger_pos = None
@@ -108,7 +118,7 @@ class MapApp:
         LinerTouch から 1フレームごとに呼ばれるコールバック。
         ここでは、1本指の場合にマップをドラッグする処理を行う。
         """
-        estimated_data = self.liner.estimated_data
+        estimated_data = self.liner.frame.estimated_data
         if len(estimated_data) == 1:
             # 1本指ならパン操作とみなす
             current_pos_sensor = estimated_data[0]
@@ -134,6 +144,6 @@ class MapApp:
         logger.info("Tap detected on map!")
 
     # ===== ピンチ用コールバック群 =====
-    def on_pinch_start(self, event=None):
+    def on_pinch_start(self, frame=None):
         """2本指が新たに検出された時（ピンチ開始）"""
      
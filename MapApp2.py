@@ -8,6 +8,7 @@ from tkintermapview import TkinterMapView
 
 # 同じフォルダに置いた LinerTouch.py をインポート
 from LinerTouch import LinerTouch
+from tk_bridge import TkCallbackBridge
 
 logger = logging.getLogger(__name__)
 
@@ -43,18 +44,26 @@ class MapApp:
         self.map_widget.set_position(35.681236, 139.767125)  # lat, lon
         self.map_widget.set_zoom(12)
 
+        # コールバックは LinerTouch のスレッドで呼ばれるため、
+        # Tk のメインループに渡して実行する (更新は画面の更新ごとに最新の1回)
+        self.tk_bridge = TkCallbackBridge(master)
+        post = self.tk_bridge.post
+
         # LinerTouch のインスタンス生成（変更はしない）
         self.liner = LinerTouch(
-            update_callback=self.on_sensor_update,
-            tap_callback=self.on_tap,
+            update_callback=self.tk_bridge.coalesce(self.on_sensor_update),
+            tap_callback=post(self.on_tap),
             plot_graph=False
         )
 
         # ピンチ関連のコールバック（2本指）
-        self.liner.pinch_start_callback = self.on_pinch_start
-        self.liner.pinch_motion_callback = self.on_pinch_motion
-        self.liner.pinch_update_callback = self.on_pinch_update
-        self.liner.pinch_end_callback = self.on_pinch_end
+        # メインループで実行する時には次のフレームに進んでいるため、
+        # 呼ばれた時点のフレーム (liner.frame) を先頭の引数で渡す
+        frame = lambda: self.liner.frame
+        self.liner.pinch_start_callback = post(self.on_pinch_start, frame)
+        self.liner.pinch_motion_callback = post(self.on_pinch_motion, frame)
+        self.liner.pinch_update_callback = post(self.on_pinch_update, frame)
+        self.liner.pinch_end_callback = post(self.on_pinch_end, frame)
 
         # 1本指ドラッグ用: 前フレームの指位置(センサ座標)を記録
         self.last_single_finger_sensor_pos = None
@@ -64,7 +73,7 @@ class MapApp:
         LinerTouchから1フレームごとに呼ばれるコールバック。
         1本指ならパン操作としてマップを移動する。
         """
-        estimated_data = self.liner.estimated_data
+        estimated_data = self.liner.frame.estimated_data
 
         # 1本指の場合 → マップをパン（移動）
         if len(estimated_data) == 1:
@@ -119,17 +128,18 @@ class MapApp:
     # -------------------------------
     #  2本指ピンチ用コールバック群
     # -------------------------------
-    def on_pinch_start(self, event=None):
+    def on_pinch_start(self, frame):
         logger.info("Pinch Start")
 
-    def on_pinch_motion(self, event=None):
+    def on_pinch_motion(self, frame):
         """
         2本指がドラッグ（中心座標が移動）したときに呼ばれる。
+        frame はその時点のフレーム (中心は LinerTouch.get_mid_pos(frame.estimated_data))。
         今回の例ではパン操作は1本指に割り当てているので、ここでは何もしない。
         """
         pass
 
-    def on_pinch_update(self, dist):
+    def on_pinch_update(self, frame, dist):
         """
         ピンチの拡大／縮小量が変化したときのコールバック
         dist が正 → 2本指が離れる(拡大)
@@ -154,7 +164,7 @@ class MapApp:
         self.map_widget.set_zoom(new_zoom)
         logger.info(f"Pinch zoom => {new_zoom:.1f}")
 
-    def on_pinch_end(self):
+    def on_pinch_end(self, frame):
         logger.info("Pinch End")
 
 
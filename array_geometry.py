@@ -0,0 +1,123 @@
+import json
+
+import numpy as np
+
+from frame_source import MergedSource, SerialSource
+
+# LinerTouch.ino の1枚のボードにつなげるセンサの最大数 (MAX_NUM_SENSOR)
+MAX_BOARD_SENSORS = 10
+
+
+class BoardSegment:
+    """
+    1枚のボード (LinerTouch.ino) が受け持つセンサの並び。
+    sensor_x はバー全体の座標でのセンサの x 座標 (mm)。
+    port を省略したボードは開かない (記録したデータの再生など)。
+    """
+
+    def __init__(self, sensor_x, port=None, baudrate=115200, binary_frame=False):
+        self.sensor_x = np.asarray(sensor_x)
+        self.port = port
+        self.baudrate = baudrate
+        self.binary_frame = binary_frame
+
+    @property
+    def sensor_num(self):
+        return len(self.sensor_x)
+
+    def open_source(self):
+        return SerialSource(
+            port=self.port, baudrate=self.baudrate, binary_frame=self.binary_frame
+        )
+
+
+class ArrayGeometry:
+    """
+    センサの並び (センサの数, センサごとの x 座標, ボードごとの区間)。
+    ボードはバーの左から順に並べ、フレームのセンサもその順につなげる。
+    隣のセンサとの間隔が max_gap (mm) より広い場合 (ボードのつなぎ目など) は
+    同じデータ郡にしない。
+
+    設定ファイル (JSON) の例:
+        {
+          "sensor_ratio": 10,
+          "boards": [
+            {"port": "COM9", "sensor_num": 10, "x0": 0},
+            {"port": "COM10", "sensor_num": 10, "x0": 100},
+            {"port": "COM11", "sensor_x": [200, 210, 220, 230]}
+          ]
+        }
+    ボードのセンサは sensor_x で並べるか、x0 から pitch (省略時は sensor_ratio)
+    間隔に sensor_num 個並べる。
+    """
+
+    def __init__(self, segments, sensor_ratio=10, max_gap=None):
+        self.segments = list(segments)
+        self.sensor_ratio = sensor_ratio
+        self.sensor_x = np.concatenate([segment.sensor_x for segment in self.segments])
+        if np.any(np.diff(self.sensor_x) <= 0):
+            raise ValueError("センサの x 座標は左から順に並べる")
+        self.max_gap = 1.5 * sensor_ratio if max_gap is None else max_gap
+        # 隣のセンサとの間でデータ郡を区切るか ((sensor_num - 1,) の配列)
+        self.breaks = np.diff(self.sensor_x) > self.max_gap
+
+    @property
+    def sensor_num(self):
+        return len(self.sensor_x)
+
+    def x_bounds(self):
+        """
+        推定位置の x の範囲 (従来と同じく最後のセンサから1個分の幅まで含める)
+        """
+        return (float(self.sensor_x[0]), float(self.sensor_x[-1] + self.sensor_ratio))
+
+    def open_source(self, threaded=True):
+        """
+        ボードごとにシリアル通信を開き、1つのフレームの入力元にする。
+        ボードが2枚以上の場合は時刻で揃えてつなげる (frame_source.MergedSource)。
+        threaded=False の場合はボードを読むスレッドを起動しない (DeviceManager で読む)。
+        """
+        sources = [segment.open_source() for segment in self.segments]
+        if len(sources) == 1:
+            return sources[0]
+        return MergedSource(
+            sources,
+            [segment.sensor_num for segment in self.segments],
+            threaded=threaded,
+        )
+
+    @classmethod
+    def uniform(cls, sensor_num, sensor_ratio=10):
+        """
+        sensor_ratio 間隔に並んだ sensor_num 個のセンサ (1枚のボードとみなす)。
+        """
+        return cls([BoardSegment(np.arange(sensor_num) * sensor_ratio)], sensor_ratio)
+
+    @classmethod
+    def from_config(cls, config):
+        sensor_ratio = config.get("sensor_ratio", 10)
+        segments = []
+        for board in config["boards"]:
+            if "sensor_x" in board:
+                sensor_x = board["sensor_x"]
+            else:
+                pitch = board.get("pitch", sensor_ratio)
+                sensor_x = board.get("x0", 0) + np.arange(board["sensor_num"]) * pitch
+            if not 1 <= len(sensor_x) <= MAX_BOARD_SENSORS:
+                raise ValueError(
+                    f"1枚のボードのセンサは 1 ~ {MAX_BOARD_SENSORS} 個: {len(sensor_x)}"
+                )
+            segments.append(
+                BoardSegment(
+                    sensor_x,
+                    port=board.get("port"),
+                    baudrate=board.get("baudrate", 115200),
+                    binary_frame=board.get("binary_frame", False),
+                )
+            )
+        return cls(segments, sensor_ratio, config.get("max_gap"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_config(json.load(f))
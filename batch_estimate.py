@@ -0,0 +1,151 @@
+import argparse
+import csv
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from frame_codec import RawFrame
+from frame_source import ReplaySource, read_range_csv
+from LinerTouch import LinerTouch
+
+logger = logging.getLogger(__name__)
+
+# ワーカープロセスごとの推定器
+estimator = None
+
+
+def init_worker(finger_radius, sensor_ratio, sensor_height):
+    """
+    ワーカープロセスで一度だけ推定器を作る。
+    シリアル通信やスレッドを使わないように空の ReplaySource を入力元にする。
+    """
+    global estimator
+    logging.getLogger("LinerTouch").setLevel(logging.WARNING)
+    estimator = LinerTouch(plot_graph=False, source=ReplaySource([]), threaded=False)
+    if finger_radius is not None:
+        estimator.finger_radius = finger_radius
+    estimator.sensor_ratio = sensor_ratio
+    if sensor_height is not None:
+        estimator.sensor_height = sensor_height
+    # フレームごとに独立に推定するため前のフレームの結果は使わない
+    estimator.warm_start = False
+    estimator.smoothing = False
+
+
+def estimate_chunk(chunk):
+    """
+    (ファイルの番号, 先頭のフレームの番号, センサの測定値のリスト) を推定し、
+    (ファイルの番号, 先頭のフレームの番号, estimated_data のリスト) を返す。
+    """
+    file_idx, start, frames = chunk
+    results = []
+    for ranges in frames:
+        frame = estimator.estimate_frame(RawFrame(None, None, ranges))
+        results.append(frame.estimated_data)
+    return file_idx, start, results
+
+
+def estimated_path(range_path, output_dir=None):
+    name = os.path.basename(range_path).replace("_range.csv", "_estimated.csv")
+    return os.path.join(output_dir or os.path.dirname(range_path), name)
+
+
+def batch_estimate(
+    range_paths,
+    output_dir=None,
+    workers=None,
+    chunk_size=64,
+    sensor_num=10,
+    finger_radius=None,
+    sensor_ratio=10,
+    sensor_height=None,
+):
+    """
+    *_range.csv のすべてのフレームを推定し直し、*_estimated.csv を書き出す。
+    ファイルをフレームの塊に分けてプロセスプールで並列に推定する。
+
+    Args:
+        range_paths: *_range.csv のパスのリスト
+        output_dir: 書き出すディレクトリ (None なら *_range.csv と同じ場所)
+        workers: プロセス数 (None なら CPU の数)
+        chunk_size: 1回にワーカーに渡すフレーム数
+        sensor_num: バーのセンサの数 (None ならファイルごとに最大の x から求める)
+        sensor_ratio: センサの間隔 (LinerTouch.sensor_ratio と合わせる)
+        finger_radius, sensor_height: 推定に使う値 (None なら LinerTouch の既定値)
+    Returns:
+        書き出したファイルのパスのリスト
+    """
+    files = [read_range_csv(path, sensor_ratio, sensor_num) for path in range_paths]
+    chunks = [
+        (file_idx, start, frames[start : start + chunk_size])
+        for file_idx, frames in enumerate(files)
+        for start in range(0, len(frames), chunk_size)
+    ]
+    estimated = [[None] * len(frames) for frames in files]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(finger_radius, sensor_ratio, sensor_height),
+    ) as executor:
+        for file_idx, start, results in executor.map(estimate_chunk, chunks):
+            estimated[file_idx][start : start + len(results)] = results
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    output_paths = []
+    for path, rows in zip(range_paths, estimated):
+        output_path = estimated_path(path, output_dir)
+        with open(output_path, "w", encoding="utf-8", newline="") as f:
+            # GetData_exp1.py と同じく1行に推定位置 [x, y] を並べる
+            csv.writer(f).writerows(rows)
+        output_paths.append(output_path)
+    return output_paths
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(levelname)s] %(name)s: %(message)s",
+    )
+    parser = argparse.ArgumentParser(
+        description="*_range.csv を推定し直して *_estimated.csv を書き出す"
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="*_range.csv のパス (glob のパターンも可)"
+    )
+    parser.add_argument(
+        "-o", "--output-dir", help="書き出すディレクトリ (省略時は入力と同じ場所)"
+    )
+    parser.add_argument("-j", "--workers", type=int, help="プロセス数")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--sensor-num", type=int, default=10)
+    parser.add_argument(
+        "--infer-sensor-num",
+        action="store_true",
+        help="センサの数をファイルごとに最大の x から求める (--sensor-num を使わない)",
+    )
+    parser.add_argument("--finger-radius", type=float)
+    parser.add_argument("--sensor-ratio", type=int, default=10)
+    parser.add_argument("--sensor-height", type=float)
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.inputs for path in glob.glob(pattern)})
+    paths = [path for path in paths if path.endswith("_range.csv")]
+    if not paths:
+        parser.error("*_range.csv が見つからない")
+    start = time.perf_counter()
+    outputs = batch_estimate(
+        paths,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        sensor_num=None if args.infer_sensor_num else args.sensor_num,
+        finger_radius=args.finger_radius,
+        sensor_ratio=args.sensor_ratio,
+        sensor_height=args.sensor_height,
+    )
+    logger.info(
+        f"{len(outputs)} ファイルを {time.perf_counter() - start:.1f} 秒で書き出した"
+    )
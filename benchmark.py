@@ -0,0 +1,224 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import time
+from collections import defaultdict
+from functools import wraps
+
+import numpy as np
+import scipy
+
+from frame_source import CsvReplaySource, ReplaySource
+from LinerTouch import LinerTouch
+
+logger = logging.getLogger(__name__)
+
+# 計測する段 (LinerTouch のメソッド名)
+# split_x_data は検知したセンサ数ごとにも集計する
+SEGMENT_STAGES = ["split_x_data"]
+# 第1引数が range_data の段はデータ郡のセンサ数ごとにも集計する
+CLUSTER_STAGES = ["split_finger_data", "lr_min_inv", "filter_inv_solve"]
+# filter_inv_solve_batch は一度に解く仮説の数ごとに集計する
+BATCH_STAGES = ["filter_inv_solve_batch"]
+FRAME_STAGES = ["update_data", "smoothing_filter", "get_touch", "get_pinch"]
+DEFAULT_INPUTS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "exp1_", "*_range.csv"
+)
+PERCENTILES = [50, 95, 99]
+
+
+class StageTimer:
+    """
+    インスタンスのメソッドを置き換えて呼び出しごとの処理時間 (ns) を記録する。
+    """
+
+    def __init__(self):
+        # 段 -> バケット -> 処理時間(ns) のリスト
+        self.samples = defaultdict(lambda: defaultdict(list))
+
+    def wrap(self, obj, name, bucket=None):
+        func = getattr(obj, name)
+        samples = self.samples[name]
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            result = func(*args, **kwargs)
+            elapsed = time.perf_counter_ns() - start
+            samples["all"].append(elapsed)
+            if bucket is not None:
+                samples[bucket(*args)].append(elapsed)
+            return result
+
+        setattr(obj, name, wrapper)
+
+    def summary(self):
+        return {
+            stage: {
+                bucket: summarize(values)
+                for bucket, values in sorted(buckets.items(), key=bucket_order)
+            }
+            for stage, buckets in self.samples.items()
+        }
+
+
+def bucket_order(item):
+    # "all" を先にしてセンサ数の小さい順に並べる
+    bucket = item[0]
+    return (0, 0) if bucket == "all" else (1, int(bucket))
+
+
+def detected_count(values):
+    return str(np.count_nonzero(~np.isnan(values)))
+
+
+def cluster_size(range_data, *args):
+    return str(len(range_data))
+
+
+def batch_size(range_data_list):
+    return str(len(range_data_list))
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=float) / 1e3
+    mean = values.mean()
+    stats = {"count": len(values), "mean_us": mean}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{p}_us"] = value
+    stats["max_us"] = values.max()
+    stats["fps"] = 1e6 / mean if mean > 0 else float("inf")
+    return stats
+
+
+def make_estimator(warm_start=True, lookup_table=False, smoothing=False):
+    logging.getLogger("LinerTouch").setLevel(logging.WARNING)
+    liner = LinerTouch(
+        plot_graph=False,
+        source=ReplaySource([]),
+        threaded=False,
+        lookup_table=lookup_table,
+    )
+    liner.warm_start = warm_start
+    liner.smoothing = smoothing
+    # ジェスチャの検出処理を通すため何もしないコールバックを登録する
+    liner.tap_callback = lambda: None
+    liner.pinch_start_callback = lambda: None
+    liner.pinch_end_callback = lambda: None
+    liner.pinch_motion_callback = lambda: None
+    liner.pinch_update_callback = lambda diff: None
+    return liner
+
+
+def run_benchmark(frames, repeat=1, **options):
+    """
+    記録したフレームを LinerTouch.update_data に順に通し、段ごとの処理時間を集計する。
+
+    Args:
+        frames: RawFrame のリスト
+        repeat: 繰り返す回数 (回ごとに推定器を作り直す)
+        options: make_estimator に渡す設定
+    Returns:
+        段 -> バケット -> 統計値 の dict
+    """
+    timer = StageTimer()
+    for _ in range(repeat):
+        liner = make_estimator(**options)
+        for name in SEGMENT_STAGES:
+            timer.wrap(liner, name, detected_count)
+        for name in CLUSTER_STAGES:
+            timer.wrap(liner, name, cluster_size)
+        for name in BATCH_STAGES:
+            timer.wrap(liner, name, batch_size)
+        for name in FRAME_STAGES:
+            timer.wrap(liner, name)
+        for frame in frames:
+            if not liner.smoothing:
+                # 推定には使わないがフィルタだけ計測する
+                liner.smoothing_filter(frame.ranges)
+            liner.update_data(frame)
+    return timer.summary()
+
+
+def print_summary(summary, baseline=None):
+    header = f"{'stage':<24}{'bucket':>7}{'count':>8}"
+    header += "".join(f"{f'p{p}':>10}" for p in PERCENTILES)
+    header += f"{'max':>10}{'fps':>10}"
+    if baseline is not None:
+        header += f"{'p50 vs':>9}"
+    print(header + "   (us)")
+    for stage, buckets in summary.items():
+        for bucket, stats in buckets.items():
+            line = f"{stage:<24}{bucket:>7}{stats['count']:>8}"
+            line += "".join(f"{stats[f'p{p}_us']:>10.1f}" for p in PERCENTILES)
+            line += f"{stats['max_us']:>10.1f}{stats['fps']:>10.0f}"
+            base = (baseline or {}).get(stage, {}).get(bucket)
+            if base is not None:
+                line += f"{stats['p50_us'] / base['p50_us']:>8.2f}x"
+            print(line)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(levelname)s] %(name)s: %(message)s",
+    )
+    parser = argparse.ArgumentParser(
+        description="記録したフレームで推定の段ごとの処理時間を計測する"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[DEFAULT_INPUTS],
+        help="*_range.csv のパス (glob のパターンも可)",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--sensor-num", type=int, default=10)
+    parser.add_argument("--no-warm-start", action="store_true")
+    parser.add_argument("--lookup-table", action="store_true")
+    parser.add_argument("--smoothing", action="store_true")
+    parser.add_argument("--json", help="結果を書き出す JSON のパス")
+    parser.add_argument("--compare", help="比較する以前の結果の JSON のパス")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.inputs for path in glob.glob(pattern)})
+    if not paths:
+        parser.error("*_range.csv が見つからない")
+    source = CsvReplaySource(paths, sensor_num=args.sensor_num, speed=None)
+    frames = [frame for _, frame in source.records]
+    options = {
+        "warm_start": not args.no_warm_start,
+        "lookup_table": args.lookup_table,
+        "smoothing": args.smoothing,
+    }
+    start = time.perf_counter()
+    summary = run_benchmark(frames, repeat=args.repeat, **options)
+    elapsed = time.perf_counter() - start
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+    print_summary(summary, baseline)
+    logger.info(f"{len(frames) * args.repeat} フレームを {elapsed:.2f} 秒で処理した")
+
+    if args.json:
+        result = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "inputs": paths,
+            "frames": len(frames),
+            "repeat": args.repeat,
+            "options": options,
+            "platform": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "scipy": scipy.__version__,
+                "machine": platform.machine(),
+            },
+            "stages": summary,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
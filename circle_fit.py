@@ -0,0 +1,369 @@
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+# ゼロ除算を避けるための微小値
+EPS = 1e-9
+
+
+def initial_estimate(range_x, range_d):
+    """
+    線形化した最小二乗で (x, y) の初期値を求める。
+    (x - x_i)^2 + y^2 = d_i^2 を平均で引くと x についての一次式になる。
+
+    Args:
+        range_x: センサの x 座標の配列
+        range_d: センサから指の中心までの距離 (r_i + 指の半径) の配列
+    Returns:
+        [x, y] の ndarray
+    """
+    x_mean = range_x.mean()
+    a = range_x - x_mean
+    aa = a @ a
+    # センサが1個 (またはすべて同じ位置) の場合は真上にあるとみなす
+    if aa < EPS:
+        return np.array([x_mean, range_d.mean()])
+    b = range_x**2 - range_d**2
+    x = (a @ (b - b.mean())) / (2 * aa)
+    y2 = np.mean(range_d**2 - (x - range_x) ** 2)
+    return np.array([x, np.sqrt(max(y2, 0.0))])
+
+
+def fit_circle(
+    range_x,
+    range_r,
+    finger_radius,
+    bounds,
+    initial_guess=None,
+    max_iter=20,
+    xtol=1e-4,
+    ftol=1e-8,
+    warm_tol=None,
+):
+    """
+    センサ x_i から距離 r_i + finger_radius にある点 (x, y) を求める。
+    線形最小二乗の初期値から、解析的ヤコビアンを用いた
+    Levenberg-Marquardt 法を数回反復する。範囲外に出た値は bounds に丸める。
+
+    Args:
+        range_x: センサの x 座標の配列
+        range_r: センサの測定距離の配列
+        finger_radius: 指の半径
+        bounds: [(x_min, x_max), (y_min, y_max)]
+        initial_guess: 初期値の候補 [x, y] (線形最小二乗の値より誤差が小さい場合に使う)
+        max_iter: 最大反復回数
+        xtol: 収束とみなす更新量 (mm)
+        ftol: 収束とみなす二乗誤差
+        warm_tol: initial_guess の残差の二乗平均平方根がこの値以下なら反復しない
+    Returns:
+        scipy.optimize.minimize と同じ x, fun, success, nit, message を持つ OptimizeResult
+        fun は残差の二乗平均平方根
+    """
+    range_x = np.asarray(range_x, dtype=float)
+    range_d = np.asarray(range_r, dtype=float) + finger_radius
+    (x_min, x_max), (y_min, y_max) = bounds
+
+    # 要素数が2個なので numpy ではなく float で扱う
+    x, y = initial_estimate(range_x, range_d)
+    x = min(max(float(x), x_min), x_max)
+    # x を範囲に丸めた場合に合わせて y はその x から求め直す
+    dx = x - range_x
+    y = np.sqrt(max(np.mean(range_d**2 - dx * dx), 0.0))
+    y = min(max(float(y), y_min), y_max)
+    rho = np.sqrt(dx * dx + y * y)
+    res = rho - range_d
+    cost = res @ res
+    # y = y_min (0) ではヤコビアンの y の成分が0になり y が動けないため、
+    # 距離の平均の高さ (SLSQP の頃の初期値) と比べて誤差が小さい方から始める
+    if y <= y_min:
+        high_y = min(max(float(range_d.mean()), y_min), y_max)
+        high_rho = np.sqrt(dx * dx + high_y * high_y)
+        high_res = high_rho - range_d
+        high_cost = high_res @ high_res
+        if high_cost < cost:
+            y, rho, res, cost = high_y, high_rho, high_res, high_cost
+    warm = False
+    # 初期値が与えられた場合は線形最小二乗の値と比べて誤差が小さい方から始める
+    if initial_guess is not None:
+        guess_x = min(max(float(initial_guess[0]), x_min), x_max)
+        guess_y = min(max(float(initial_guess[1]), y_min), y_max)
+        guess_dx = guess_x - range_x
+        guess_rho = np.sqrt(guess_dx * guess_dx + guess_y * guess_y)
+        guess_res = guess_rho - range_d
+        guess_cost = guess_res @ guess_res
+        if guess_cost < cost:
+            x, y, dx, rho, res, cost = (
+                guess_x,
+                guess_y,
+                guess_dx,
+                guess_rho,
+                guess_res,
+                guess_cost,
+            )
+            warm = True
+    # 減衰係数
+    lam = 1e-3
+    converged = cost < ftol
+    # 前回の推定位置から始めて既に十分小さい場合はそのまま使う
+    if warm and warm_tol is not None and cost <= warm_tol**2 * len(range_x):
+        converged = True
+    nit = 0
+    while not converged and nit < max_iter:
+        nit += 1
+        rho = np.maximum(rho, EPS)
+        # 解析的ヤコビアン
+        jx = dx / rho
+        jy = y / rho
+        # 2x2 の正規方程式を直接解く
+        a = (jx @ jx) * (1 + lam) + EPS
+        b = jx @ jy
+        c = (jy @ jy) * (1 + lam) + EPS
+        gx = jx @ res
+        gy = jy @ res
+        det = a * c - b * b
+        step_x = (c * gx - b * gy) / det
+        step_y = (a * gy - b * gx) / det
+        # 範囲の端に張り付いている変数は固定して、残りの変数だけで解き直す
+        if (y >= y_max and step_y < 0) or (y <= y_min and step_y > 0):
+            step_x, step_y = gx / a, 0.0
+        elif (x >= x_max and step_x < 0) or (x <= x_min and step_x > 0):
+            step_x, step_y = 0.0, gy / c
+        new_x = min(max(x - step_x, x_min), x_max)
+        new_y = min(max(y - step_y, y_min), y_max)
+        new_dx = new_x - range_x
+        new_rho = np.sqrt(new_dx * new_dx + new_y * new_y)
+        new_res = new_rho - range_d
+        new_cost = new_res @ new_res
+        if new_cost <= cost:
+            moved = max(abs(new_x - x), abs(new_y - y))
+            x, y, dx, rho, res, cost = new_x, new_y, new_dx, new_rho, new_res, new_cost
+            lam *= 0.1
+            converged = moved < xtol or cost < ftol
+        else:
+            lam *= 10
+
+    return OptimizeResult(
+        x=np.array([x, y]),
+        fun=float(np.sqrt(cost / len(range_x))),
+        success=bool(converged),
+        nit=nit,
+        message=(
+            "Optimization terminated successfully"
+            if converged
+            else "Iteration limit reached"
+        ),
+    )
+
+
+def pad_subsets(subsets):
+    """
+    長さの異なる (x 配列, r 配列) のリストを、マスク付きの2次元配列に詰める。
+
+    Args:
+        subsets: [(range_x, range_r), ...]
+    Returns:
+        (range_x, range_r, mask) それぞれ (仮説の数, 最大センサ数) の ndarray
+    """
+    width = max(len(x) for x, _ in subsets)
+    range_x = np.zeros((len(subsets), width))
+    range_r = np.zeros((len(subsets), width))
+    mask = np.zeros((len(subsets), width), dtype=bool)
+    for i, (x, r) in enumerate(subsets):
+        range_x[i, : len(x)] = x
+        range_r[i, : len(r)] = r
+        mask[i, : len(x)] = True
+    return range_x, range_r, mask
+
+
+def fit_circle_batch(
+    range_x,
+    range_r,
+    mask,
+    finger_radius,
+    bounds,
+    initial_guess=None,
+    max_iter=20,
+    xtol=1e-4,
+    ftol=1e-8,
+    warm_tol=None,
+):
+    """
+    fit_circle を複数の仮説 (センサの部分集合) についてまとめて解く。
+    各行がひとつの仮説で、mask が False の要素は詰め物として無視する。
+    反復は全行同時に行い、収束した行は更新しない。
+    行が十数個以下では fit_circle を繰り返す方が速いため、表 (circle_lut) を作る時に使う。
+
+    Args:
+        range_x: (仮説の数, 最大センサ数) のセンサの x 座標
+        range_r: (仮説の数, 最大センサ数) のセンサの測定距離
+        mask: (仮説の数, 最大センサ数) の有効な要素を示す bool 配列
+        finger_radius: 指の半径
+        bounds: [(x_min, x_max), (y_min, y_max)]
+        initial_guess: (仮説の数, 2) の初期値の候補 (NaN の行は線形最小二乗の値を使う)
+        max_iter: 最大反復回数
+        xtol: 収束とみなす更新量 (mm)
+        ftol: 収束とみなす二乗誤差
+        warm_tol: initial_guess の残差の二乗平均平方根がこの値以下の行は反復しない
+    Returns:
+        仮説ごとの OptimizeResult のリスト (fit_circle と同じ形式)
+    """
+    range_x = np.asarray(range_x, dtype=float)
+    range_d = np.asarray(range_r, dtype=float) + finger_radius
+    weight = np.asarray(mask, dtype=float)
+    count = np.maximum(weight.sum(axis=1), 1)
+    (x_min, x_max), (y_min, y_max) = bounds
+
+    # 線形最小二乗による初期値 (initial_estimate を行ごとに計算)
+    x_mean = (range_x * weight).sum(axis=1) / count
+    a = (range_x - x_mean[:, None]) * weight
+    aa = (a * a).sum(axis=1)
+    b = (range_x**2 - range_d**2) * weight
+    b -= ((b.sum(axis=1) / count)[:, None]) * weight
+    degenerate = aa < EPS
+    x = np.where(degenerate, x_mean, (a * b).sum(axis=1) / (2 * np.maximum(aa, EPS)))
+    x = np.clip(x, x_min, x_max)
+    # x を範囲に丸めた場合に合わせて y はその x から求め直す
+    y2 = ((range_d**2 - (x[:, None] - range_x) ** 2) * weight).sum(axis=1) / count
+    y = np.clip(np.sqrt(np.maximum(y2, 0.0)), y_min, y_max)
+
+    def residual(x, y):
+        dx = x[:, None] - range_x
+        rho = np.sqrt(dx * dx + (y * y)[:, None])
+        res = (rho - range_d) * weight
+        return dx, rho, res, (res * res).sum(axis=1)
+
+    dx, rho, res, cost = residual(x, y)
+    # y = y_min の行は距離の平均の高さと比べて誤差が小さい方から始める (fit_circle と同じ)
+    d_mean = (range_d * weight).sum(axis=1) / count
+    high_y = np.clip(d_mean, y_min, y_max)
+    high_dx, high_rho, high_res, high_cost = residual(x, high_y)
+    high = (y <= y_min) & (high_cost < cost)
+    y = np.where(high, high_y, y)
+    rho = np.where(high[:, None], high_rho, rho)
+    res = np.where(high[:, None], high_res, res)
+    cost = np.where(high, high_cost, cost)
+    warm = np.zeros(len(x), dtype=bool)
+    # 初期値が与えられた行は線形最小二乗の値と比べて誤差が小さい方から始める
+    if initial_guess is not None:
+        initial_guess = np.asarray(initial_guess, dtype=float)
+        given = ~np.isnan(initial_guess).any(axis=1)
+        guess_x = np.clip(np.where(given, initial_guess[:, 0], x), x_min, x_max)
+        guess_y = np.clip(np.where(given, initial_guess[:, 1], y), y_min, y_max)
+        guess_dx, guess_rho, guess_res, guess_cost = residual(guess_x, guess_y)
+        warm = given & (guess_cost < cost)
+        x = np.where(warm, guess_x, x)
+        y = np.where(warm, guess_y, y)
+        dx = np.where(warm[:, None], guess_dx, dx)
+        rho = np.where(warm[:, None], guess_rho, rho)
+        res = np.where(warm[:, None], guess_res, res)
+        cost = np.where(warm, guess_cost, cost)
+    # 行ごとの減衰係数
+    lam = np.full(len(x), 1e-3)
+    converged = cost < ftol
+    # 前回の推定位置から始めて既に十分小さい行はそのまま使う
+    if warm_tol is not None:
+        converged |= warm & (cost <= warm_tol**2 * count)
+    nit = np.zeros(len(x), dtype=int)
+    for _ in range(max_iter):
+        if converged.all():
+            break
+        active = ~converged
+        nit += active
+        rho = np.maximum(rho, EPS)
+        # 解析的ヤコビアン (詰め物の要素は0)
+        jx = dx / rho * weight
+        jy = y[:, None] / rho * weight
+        # 行ごとの 2x2 正規方程式を直接解く
+        a = (jx * jx).sum(axis=1) * (1 + lam) + EPS
+        b = (jx * jy).sum(axis=1)
+        c = (jy * jy).sum(axis=1) * (1 + lam) + EPS
+        gx = (jx * res).sum(axis=1)
+        gy = (jy * res).sum(axis=1)
+        det = a * c - b * b
+        step_x = (c * gx - b * gy) / det
+        step_y = (a * gy - b * gx) / det
+        # 範囲の端に張り付いている変数は固定して、残りの変数だけで解き直す
+        fix_y = ((y >= y_max) & (step_y < 0)) | ((y <= y_min) & (step_y > 0))
+        fix_x = ~fix_y & (
+            ((x >= x_max) & (step_x < 0)) | ((x <= x_min) & (step_x > 0))
+        )
+        step_x = np.where(fix_y, gx / a, np.where(fix_x, 0.0, step_x))
+        step_y = np.where(fix_y, 0.0, np.where(fix_x, gy / c, step_y))
+        new_x = np.clip(x - step_x, x_min, x_max)
+        new_y = np.clip(y - step_y, y_min, y_max)
+        new_dx, new_rho, new_res, new_cost = residual(new_x, new_y)
+        accept = active & (new_cost <= cost)
+        moved = np.maximum(np.abs(new_x - x), np.abs(new_y - y))
+        x = np.where(accept, new_x, x)
+        y = np.where(accept, new_y, y)
+        dx = np.where(accept[:, None], new_dx, dx)
+        rho = np.where(accept[:, None], new_rho, rho)
+        res = np.where(accept[:, None], new_res, res)
+        cost = np.where(accept, new_cost, cost)
+        lam = np.where(accept, lam * 0.1, np.where(active, lam * 10, lam))
+        converged |= accept & ((moved < xtol) | (cost < ftol))
+
+    fun = np.sqrt(cost / count)
+    return [
+        OptimizeResult(
+            x=np.array([x[i], y[i]]),
+            fun=float(fun[i]),
+            success=bool(converged[i]),
+            nit=int(nit[i]),
+            message=(
+                "Optimization terminated successfully"
+                if converged[i]
+                else "Iteration limit reached"
+            ),
+        )
+        for i in range(len(x))
+    ]
+
+
+if __name__ == "__main__":
+    # 範囲の端に丸められるデータ郡で scipy.optimize.least_squares と結果を比べる
+    from scipy.optimize import least_squares
+
+    finger_radius = 14.9 / 2
+    bounds = [(0, 90), (0, 100)]
+    clusters = [
+        ([50, 60], [99, 117]),
+        ([0, 10], [80, 30]),
+        ([80, 90], [20, 95]),
+        ([0, 10, 20], [90, 60, 100]),
+        ([40, 50, 60], [10, 12, 11]),
+    ]
+    lower, upper = np.array(bounds).T
+    for range_x, range_r in clusters:
+        range_x = np.array(range_x, dtype=float)
+        range_d = np.array(range_r, dtype=float) + finger_radius
+        result = fit_circle(range_x, range_r, finger_radius, bounds)
+        # 参照解は複数の初期値から解いて最も誤差が小さいもの
+        reference = min(
+            (
+                least_squares(
+                    lambda p: np.hypot(p[0] - range_x, p[1]) - range_d,
+                    np.clip(start, lower + 1e-6, upper - 1e-6),
+                    bounds=(lower, upper),
+                )
+                for start in (
+                    [range_x.mean(), range_d.mean()],
+                    [range_x.mean(), 1.0],
+                    [lower[0], range_d.mean()],
+                    [upper[0], range_d.mean()],
+                )
+            ),
+            key=lambda ref: ref.cost,
+        )
+        reference_fun = np.sqrt(2 * reference.cost / len(range_x))
+        print(
+            f"x={range_x.tolist()} r={range_r}: fit_circle {result.x.round(1)} "
+            f"rms={result.fun:.2f}, least_squares {reference.x.round(1)} "
+            f"rms={reference_fun:.2f}"
+        )
+        assert result.fun <= reference_fun + 1e-3, "fit_circle の誤差が参照解より大きい"
+
+    # fit_circle_batch は fit_circle と同じ結果になる
+    batch = fit_circle_batch(*pad_subsets(clusters), finger_radius, bounds)
+    for (range_x, range_r), result in zip(clusters, batch):
+        single = fit_circle(range_x, range_r, finger_radius, bounds)
+        assert np.allclose(result.x, single.x), "fit_circle_batch と fit_circle の結果が違う"
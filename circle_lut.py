@@ -0,0 +1,139 @@
+import logging
+import os
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+from circle_fit import fit_circle_batch
+from frame_codec import OUT_OF_RANGE
+
+logger = logging.getLogger(__name__)
+
+# 表を保存するディレクトリ
+DEFAULT_TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# fit_circle の結果が変わった場合に上げて、保存済みの表を作り直させる
+TABLE_VERSION = 2
+
+
+class CircleFitTable:
+    """
+    センサが1個または隣り合う2個のデータ郡について、fit_circle の結果を
+    測定値の組ごとに事前に計算しておく表。
+    測定値は 0 から OUT_OF_RANGE - 1 までの整数なので、表の大きさは有限になる。
+
+    表は (測定値の数, 測定値の数 + 1, 4) の配列で、
+    table[r0, r1] は左のセンサを x=0、右のセンサを x=sensor_ratio とした
+    2個の場合の [x, y, fun, success]、table[r0, -1] は1個の場合の結果。
+    x は範囲で制限せずに解き、引くときに実際の範囲に収まるかを確かめる。
+    """
+
+    def __init__(
+        self,
+        finger_radius,
+        sensor_ratio,
+        sensor_height,
+        table_dir=DEFAULT_TABLE_DIR,
+        range_num=OUT_OF_RANGE,
+    ):
+        self.finger_radius = finger_radius
+        self.sensor_ratio = sensor_ratio
+        self.sensor_height = sensor_height
+        self.range_num = range_num
+        self.path = os.path.join(
+            table_dir,
+            f"circle_lut_v{TABLE_VERSION}_r{finger_radius:g}_s{sensor_ratio:g}_h{sensor_height:g}.npy",
+        )
+        self.table = self.load()
+        if self.table is None:
+            self.table = self.build()
+            self.save()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        table = np.load(self.path)
+        if table.shape != (self.range_num, self.range_num + 1, 4):
+            logger.warning(f"表の大きさが合わないため作り直す: {self.path}")
+            return None
+        return table
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        np.save(self.path, self.table)
+        logger.info(f"表を保存した: {self.path}")
+
+    def build(self):
+        """
+        すべての測定値の組を fit_circle_batch でまとめて解いて表を作る。
+        """
+        n = self.range_num
+        r0, r1 = np.meshgrid(np.arange(n), np.arange(n + 1), indexing="ij")
+        r0 = r0.ravel()
+        r1 = r1.ravel()
+        # 最後の列はセンサが1個の場合
+        single = r1 == n
+        range_x = np.tile([0.0, self.sensor_ratio], (len(r0), 1))
+        range_r = np.stack([r0, np.where(single, 0, r1)], axis=1)
+        mask = np.stack([np.ones(len(r0), dtype=bool), ~single], axis=1)
+        results = fit_circle_batch(
+            range_x,
+            range_r,
+            mask,
+            self.finger_radius,
+            [(-np.inf, np.inf), (0, self.sensor_height)],
+        )
+        table = np.array(
+            [[*result.x, result.fun, result.success] for result in results]
+        )
+        return table.reshape(n, n + 1, 4)
+
+    def matches(self, finger_radius, sensor_ratio, sensor_height):
+        """
+        表を作った時の値と同じか (違う場合は表を使わずに解く)。
+        """
+        return (self.finger_radius, self.sensor_ratio, self.sensor_height) == (
+            finger_radius,
+            sensor_ratio,
+            sensor_height,
+        )
+
+    def lookup(self, range_x, range_r, bounds):
+        """
+        表から推定位置を引く。表に無いデータ郡の場合は None を返す。
+
+        Args:
+            range_x: センサの x 座標の配列
+            range_r: センサの測定距離の配列
+            bounds: [(x_min, x_max), (y_min, y_max)]
+        Returns:
+            fit_circle と同じ形式の OptimizeResult または None
+        """
+        if not 1 <= len(range_x) <= 2:
+            return None
+        # ローパスフィルタを通した値などの整数でない測定値は表に無い
+        idx = np.asarray(range_r)
+        valid = (idx == np.round(idx)) & (idx >= 0) & (idx < self.range_num)
+        if not valid.all():
+            return None
+        idx = idx.astype(int)
+        if len(range_x) == 1:
+            x, y, fun, success = self.table[idx[0], -1]
+        else:
+            # 隣り合うセンサでなければ表に無い
+            if range_x[1] - range_x[0] != self.sensor_ratio:
+                return None
+            x, y, fun, success = self.table[idx[0], idx[1]]
+        x += range_x[0]
+        (x_min, x_max), (y_min, y_max) = bounds
+        # 範囲の端に掛かる場合や表を作る時に解けなかった場合は解き直す
+        if not success or not x_min <= x <= x_max:
+            return None
+        if (y_min, y_max) != (0, self.sensor_height):
+            return None
+        return OptimizeResult(
+            x=np.array([x, y]),
+            fun=float(fun),
+            success=True,
+            nit=0,
+            message="Lookup table",
+        )
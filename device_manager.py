@@ -0,0 +1,253 @@
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+
+from frame_pipeline import LatestQueue
+from frame_source import MergedSource, SerialSource
+from LinerTouch import LinerTouch
+
+logger = logging.getLogger(__name__)
+
+
+class Device:
+    """
+    DeviceManager で開いた1台のデバイス (LinerTouch と入力元のボード)。
+    """
+
+    def __init__(self, name, liner):
+        self.name = name
+        self.liner = liner
+        source = liner.source
+        # ボードが複数の場合は読んだフレームを MergedSource で揃えてつなげる
+        self.merged = source if isinstance(source, MergedSource) else None
+        self.boards = source.sources if self.merged is not None else [source]
+
+
+class DeviceManager:
+    """
+    複数の LinerTouch (デバイス) を1つのプロセスで動かす。
+    すべてのデバイスのボードを1つの読み込みスレッドで読み (selector で待つ)、
+    推定とコールバックは1つの処理スレッドでデバイスごとの最新のフレームに対して行う。
+    selector に登録できるボードだけならスレッドの数はデバイスの数によらず2つ。
+
+    ファイル記述子を使えないボード (Windows の COM ポートや loop://) は、
+    ボードごとのスレッドで SerialSource と同じくブロッキングで読み、
+    読んだフレームを読み込みスレッドに渡す (待っている間は CPU を使わない)。
+
+    推定したフレーム (liner_frame.Frame) は subscribe で受け取る。
+
+        manager = DeviceManager()
+        manager.open("left", port="COM9")
+        manager.open("right", geometry=ArrayGeometry.load("right.json"))
+        frames = manager.subscribe()  # すべてのデバイス
+        manager.start()
+        name, frame = frames.get()
+    """
+
+    def __init__(self, select_timeout=0.05):
+        self.select_timeout = select_timeout
+        self.devices = {}
+        self.lock = threading.Lock()
+        # 読み込みスレッドで selector に登録するデバイス
+        self.added = []
+        # デバイス名 (None はすべてのデバイス) -> LatestQueue のリスト
+        self.subscribers = {}
+        # 推定を待っているフレームがあることを処理スレッドに知らせる
+        self.frame_ready = threading.Event()
+        self.running = False
+        self.threads = []
+        # selector に登録できないボードを読むスレッドが読んだ
+        # (デバイス, ボードの番号, RawFrame, 受信時刻) と、読み込みスレッドを起こすソケット
+        self.received = queue.SimpleQueue()
+        self.wake_recv = self.wake_send = None
+
+    def open(
+        self, name, port=None, geometry=None, binary_frame=False, source=None, **options
+    ):
+        """
+        デバイスを開いて登録し、その LinerTouch を返す。
+        source を省略した場合は geometry のボード (設定が無ければ port) のシリアル通信を開く。
+        source を渡す場合は SerialSource か threaded=False の MergedSource にする。
+        options は LinerTouch に渡す (update_callback など)。
+        """
+        if name in self.devices:
+            raise ValueError(f"同じ名前のデバイスがある: {name}")
+        if source is None:
+            if geometry is not None and geometry.segments[0].port is not None:
+                source = geometry.open_source(threaded=False)
+            else:
+                source = SerialSource(port=port, binary_frame=binary_frame)
+        if isinstance(source, MergedSource) and source.threads:
+            raise ValueError("MergedSource は threaded=False で作る")
+        options.setdefault("plot_graph", False)
+        liner = LinerTouch(source=source, threaded=False, geometry=geometry, **options)
+        device = Device(name, liner)
+        with self.lock:
+            self.devices[name] = device
+            self.added.append(device)
+        return liner
+
+    def get(self, name):
+        return self.devices[name].liner
+
+    def subscribe(self, name=None, maxlen=16):
+        """
+        推定したフレームを (デバイス名, Frame) で受け取るキュー (LatestQueue) を返す。
+        name を省略した場合はすべてのデバイスのフレームを届いた順に受け取る。
+        取り出しが遅れた場合は古いものから捨てる。
+        """
+        queue = LatestQueue(maxlen=maxlen)
+        with self.lock:
+            self.subscribers.setdefault(name, []).append(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self.lock:
+            for queues in self.subscribers.values():
+                if queue in queues:
+                    queues.remove(queue)
+
+    def get_metrics(self):
+        return {name: device.liner.get_metrics() for name, device in self.devices.items()}
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.wake_recv, self.wake_send = socket.socketpair()
+        self.wake_recv.setblocking(False)
+        self.wake_send.setblocking(False)
+        threads = [
+            threading.Thread(target=self._ingest, daemon=True),
+            threading.Thread(target=self._process, daemon=True),
+        ]
+        # _ingest がボードを読むスレッドを後ろに追加する
+        self.threads = list(threads)
+        for thread in threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.frame_ready.set()
+        # ボードを読むスレッドは _ingest の中で増えるため、先に _ingest を止める
+        for thread in self.threads[:2]:
+            thread.join()
+        # ボードを読むスレッドは SerialSource の timeout までに終わる
+        for thread in self.threads[2:]:
+            thread.join()
+        self.threads = []
+        if self.wake_recv is not None:
+            self.wake_recv.close()
+            self.wake_send.close()
+            self.wake_recv = self.wake_send = None
+        for device in self.devices.values():
+            device.liner.source.close()
+
+    # 読み込みスレッド
+    def _ingest(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.wake_recv, selectors.EVENT_READ, None)
+        while self.running:
+            with self.lock:
+                added, self.added = self.added, []
+            for device in added:
+                for i, board in enumerate(device.boards):
+                    board.reset()
+                    try:
+                        selector.register(board, selectors.EVENT_READ, (device, i))
+                    except (AttributeError, OSError, ValueError):
+                        # ファイル記述子を使えないボードは別のスレッドで読む
+                        thread = threading.Thread(
+                            target=self._read_blocking, args=(device, i), daemon=True
+                        )
+                        self.threads.append(thread)
+                        thread.start()
+            for key, _ in selector.select(self.select_timeout):
+                if key.data is None:
+                    self._receive()
+                else:
+                    self._read_board(*key.data)
+            # 揃わないボードが timeout になった場合も結合したフレームを出す
+            for device in list(self.devices.values()):
+                if device.merged is not None:
+                    self._submit(device, device.merged.poll_frame(), time.perf_counter())
+        selector.close()
+
+    # selector に登録できないボードを読むスレッド
+    def _read_blocking(self, device, i):
+        board = device.boards[i]
+        while self.running:
+            frame = board.read_frame()
+            if frame is None:
+                continue
+            self.received.put((device, i, frame, board.received_time))
+            try:
+                self.wake_send.send(b"\0")
+            except (BlockingIOError, OSError):
+                # 起こす前のバイトが残っている (または止めた後)
+                pass
+
+    def _receive(self):
+        try:
+            while self.wake_recv.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        while True:
+            try:
+                device, i, frame, start = self.received.get_nowait()
+            except queue.Empty:
+                break
+            self._add_frame(device, i, frame, start)
+
+    def _read_board(self, device, i):
+        start = time.perf_counter()
+        frame = device.boards[i].read_available()
+        if frame is None:
+            return
+        self._add_frame(device, i, frame, start)
+
+    def _add_frame(self, device, i, frame, start):
+        if device.merged is not None:
+            device.merged.add(i, frame)
+            frame = device.merged.poll_frame()
+        self._submit(device, frame, start)
+
+    def _submit(self, device, frame, start):
+        if frame is None:
+            return
+        liner = device.liner
+        liner.record_frame(frame)
+        read_time = time.perf_counter()
+        # 推定が遅れた場合はデバイスごとに最新のフレームだけ推定する
+        liner.frame_queue.put((frame, read_time))
+        liner.metrics["read"].record(start, read_time)
+        self.frame_ready.set()
+
+    # 推定とコールバックのスレッド
+    def _process(self):
+        while self.running:
+            if not self.frame_ready.wait(timeout=0.1):
+                continue
+            self.frame_ready.clear()
+            for device in list(self.devices.values()):
+                liner = device.liner
+                item = liner.frame_queue.get(timeout=0)
+                if item is None:
+                    continue
+                frame, read_time = item
+                start = time.perf_counter()
+                liner.update_data(frame)
+                liner.metrics["estimate"].record(
+                    start, time.perf_counter(), read_time, len(liner.frame_queue)
+                )
+                self._publish(device.name, liner.frame)
+
+    def _publish(self, name, frame):
+        with self.lock:
+            queues = self.subscribers.get(name, []) + self.subscribers.get(None, [])
+        for queue in queues:
+            queue.put((name, frame))
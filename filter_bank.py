@@ -0,0 +1,54 @@
+import numpy as np
+from scipy import signal
+
+
+class IIRFilterBank:
+    """
+    センサごとに状態 (zi) を持つバターワースのローパスフィルタ。
+    フィルタは一度だけ設計し、フレームごとに全センサを1サンプルずつ進める。
+
+    OoR (NaN) のセンサは状態を保持したまま NaN を出力し、
+    reset_after フレームより長く途切れた場合は次の値の定常状態から始め直す。
+    """
+
+    def __init__(self, sensor_num, order=4, cutoff=10, fs=50, reset_after=5):
+        self.sos = signal.butter(order, cutoff, "lp", fs=fs, output="sos")
+        # 入力 1 に対する定常状態 (セクション数, 2)
+        self.zi_step = signal.sosfilt_zi(self.sos)
+        self.reset_after = reset_after
+        self.reset(sensor_num)
+
+    def reset(self, sensor_num=None):
+        if sensor_num is not None:
+            self.sensor_num = sensor_num
+        # (セクション数, センサ数, 2)
+        self.zi = np.zeros((len(self.sos), self.sensor_num, 2))
+        # センサごとの連続で OoR だったフレーム数 (初回は必ず始め直す)
+        self.missing = np.full(self.sensor_num, self.reset_after + 1)
+
+    def update(self, ranges):
+        """
+        1フレーム分の測定値 (OoR は NaN) を入力し、フィルタ後の値を返す。
+
+        Args:
+            ranges: (センサ数,) の測定値
+        Returns:
+            (センサ数,) のフィルタ後の値 (OoR は NaN)
+        """
+        ranges = np.asarray(ranges, dtype=float)
+        if len(ranges) != self.sensor_num:
+            self.reset(len(ranges))
+        valid = ~np.isnan(ranges)
+        # 初めての値やしばらく途切れた後の値は、その値が続いていたものとして始める
+        restart = valid & (self.missing > self.reset_after)
+        if restart.any():
+            self.zi[:, restart, :] = (
+                self.zi_step[:, None, :] * ranges[restart][None, :, None]
+            )
+        filtered, zi = signal.sosfilt(
+            self.sos, np.where(valid, ranges, 0.0)[:, None], axis=-1, zi=self.zi
+        )
+        # OoR のセンサは状態を更新しない
+        self.zi[:, valid, :] = zi[:, valid, :]
+        self.missing = np.where(valid, 0, self.missing + 1)
+        return np.where(valid, filtered[:, 0], np.nan)
@@ -0,0 +1,230 @@
+import itertools
+import logging
+from collections import namedtuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+logger = logging.getLogger(__name__)
+
+# 外部に公開するトラックの状態 (作成後は変更しない)
+# id: トラック番号, position: [x, y], velocity: [vx, vy] (mm/sec),
+# covariance: 位置の 2x2 共分散, hits: 観測と対応付いた回数
+TrackState = namedtuple(
+    "TrackState", ["id", "position", "velocity", "covariance", "hits"]
+)
+
+# 観測は位置のみ
+H = np.array([[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+
+
+class Track:
+    """
+    等速度モデルのカルマンフィルタで1本の指を追跡する。
+    状態は [x, y, vx, vy]。
+    """
+
+    def __init__(self, position, position_var, velocity_var):
+        # 番号は観測と続けて対応付いて指と確定したときに付ける (それまでは None)
+        self.id = None
+        self.state = np.array([position[0], position[1], 0.0, 0.0])
+        self.cov = np.diag([position_var, position_var, velocity_var, velocity_var])
+        # この指の推定位置の分散 (mm^2, 観測との差から更新する)
+        self.measurement_var = position_var
+        self.hits = 1
+        # 連続で観測と対応付かなかった回数
+        self.misses = 0
+
+    def predict(self, dt, accel_var):
+        f = np.eye(4)
+        f[0, 2] = f[1, 3] = dt
+        # 加速度を白色雑音とした場合のプロセス雑音
+        q = np.zeros((4, 4))
+        q[0, 0] = q[1, 1] = dt**4 / 4
+        q[0, 2] = q[2, 0] = q[1, 3] = q[3, 1] = dt**3 / 2
+        q[2, 2] = q[3, 3] = dt**2
+        self.state = f @ self.state
+        self.cov = f @ self.cov @ f.T + q * accel_var
+
+    def innovation(self, measurement):
+        # 観測との差とその共分散
+        residual = np.asarray(measurement) - H @ self.state
+        s = H @ self.cov @ H.T + np.eye(2) * self.measurement_var
+        return residual, s
+
+    def update(self, measurement, adapt_rate, var_range):
+        residual, s = self.innovation(measurement)
+        # 観測との差の2乗から予測の分散を引いたものを推定位置の分散とし、指数移動平均で更新する
+        predicted_var = np.trace(H @ self.cov @ H.T) / 2
+        sample_var = residual @ residual / 2 - predicted_var
+        self.measurement_var = np.clip(
+            (1 - adapt_rate) * self.measurement_var + adapt_rate * sample_var,
+            *var_range,
+        )
+        gain = self.cov @ H.T @ np.linalg.inv(s)
+        self.state = self.state + gain @ residual
+        self.cov = (np.eye(4) - gain @ H) @ self.cov
+        self.hits += 1
+        self.misses = 0
+
+    def snapshot(self):
+        return TrackState(
+            self.id,
+            self.state[:2].tolist(),
+            self.state[2:].tolist(),
+            self.cov[:2, :2].tolist(),
+            self.hits,
+        )
+
+
+class FingerTracker:
+    """
+    フレームごとの推定位置 (estimated_data) を既存のトラックに対応付け、
+    指ごとに番号を付けて追跡する。
+    対応付けはマハラノビス距離でゲートした上でハンガリアン法で行う。
+    """
+
+    def __init__(
+        self,
+        dt=0.02,
+        accel_var=1e6,
+        velocity_var=4e4,
+        measurement_var=100.0,
+        min_measurement_var=100.0,
+        max_measurement_var=2500.0,
+        adapt_rate=0.05,
+        gate=9.21,
+        max_misses=10,
+        confirm_hits=5,
+    ):
+        # フレームの時刻が無い場合のフレーム間隔(sec)
+        self.dt = dt
+        # 加速度の分散 (mm/sec^2)^2
+        self.accel_var = accel_var
+        # 新しいトラックの速度の分散 (mm/sec)^2
+        self.velocity_var = velocity_var
+        # 新しいトラックの推定位置の分散 (mm^2)
+        # 推定位置のばらつきは指の位置で大きく変わる (data/exp1_ の静止した指で
+        # 分散が数十 mm^2 から千 mm^2 程度) ため、トラックごとに観測との差から
+        # adapt_rate の指数移動平均で min_measurement_var ~ max_measurement_var の間で更新する
+        self.measurement_var = measurement_var
+        self.measurement_var_range = (min_measurement_var, max_measurement_var)
+        self.adapt_rate = adapt_rate
+        # マハラノビス距離の2乗のゲート (自由度2のカイ二乗分布の99%)
+        self.gate = gate
+        # この回数より多く連続で見失ったトラックは削除する
+        self.max_misses = max_misses
+        # この回数続けて観測と対応付いたトラックを指と確定して番号を付ける
+        # (推定位置が1フレームだけ外れた場合に新しい番号を付けないため)
+        self.confirm_hits = confirm_hits
+        self.tracks = []
+        self.last_time = None
+        self.ids = itertools.count()
+
+    def predict(self, frame_time=None):
+        dt = self.dt
+        if frame_time is not None and self.last_time is not None:
+            dt = max(frame_time - self.last_time, 0.0)
+        self.last_time = frame_time
+        for track in self.tracks:
+            track.predict(dt, self.accel_var)
+
+    def associate(self, estimated_data):
+        """
+        (トラックの添字, 観測の添字) の対応のリストを返す。
+        """
+        if not self.tracks or not estimated_data:
+            return []
+        cost = np.empty((len(self.tracks), len(estimated_data)))
+        for i, track in enumerate(self.tracks):
+            for j, pos in enumerate(estimated_data):
+                residual, s = track.innovation(pos)
+                cost[i, j] = residual @ np.linalg.solve(s, residual)
+        # ゲートの外は対応付けない
+        gated = np.where(cost > self.gate, self.gate * 1e3, cost)
+        rows, cols = linear_sum_assignment(gated)
+        return [(i, j) for i, j in zip(rows, cols) if cost[i, j] <= self.gate]
+
+    def update(self, estimated_data, frame_time=None):
+        """
+        1フレーム分の推定位置でトラックを更新し、トラックの状態のリストを返す。
+
+        Args:
+            estimated_data: 推定した指の位置 [x, y] のリスト
+            frame_time: フレームの時刻(sec)
+        Returns:
+            TrackState のリスト (x の小さい順)
+        """
+        self.predict(frame_time)
+        pairs = self.associate(estimated_data)
+        matched_tracks = {i for i, _ in pairs}
+        matched_data = {j for _, j in pairs}
+        for i, j in pairs:
+            self.tracks[i].update(
+                estimated_data[j], self.adapt_rate, self.measurement_var_range
+            )
+            track = self.tracks[i]
+            if track.id is None and track.hits >= self.confirm_hits:
+                track.id = next(self.ids)
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+        # 確定前のトラックは1回見失ったら削除する
+        self.tracks = [
+            t
+            for t in self.tracks
+            if t.misses <= (self.max_misses if t.id is not None else 0)
+        ]
+        # 対応付かなかった推定位置は新しい指の候補とする
+        for j, pos in enumerate(estimated_data):
+            if j not in matched_data:
+                self.tracks.append(Track(pos, self.measurement_var, self.velocity_var))
+        return self.get_tracks()
+
+    def get_tracks(self):
+        # 見失っている最中のトラックは予測位置になり、確定前のトラックは番号が無いため含めない
+        tracks = [
+            t.snapshot() for t in self.tracks if t.misses == 0 and t.id is not None
+        ]
+        return sorted(tracks, key=lambda t: t.position[0])
+
+
+if __name__ == "__main__":
+    # data/exp1_ の静止した2本の指の記録を推定し直して追跡し、指ごとの番号の数を確かめる
+    import glob
+    import os
+
+    from frame_source import CsvReplaySource
+    from LinerTouch import LinerTouch
+
+    logging.basicConfig(level=logging.ERROR)
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exp1_")
+    # 指ごとに1つの番号のまま追跡できることを確かめる記録
+    # (残りは推定位置が数十 mm 飛ぶフレームがあり、番号が1 ~ 2個増える)
+    stable = [
+        "25+20x0",
+        "25+30x0",
+        "25+50x0",
+        "50+20x0",
+        "50+30x0",
+        "50+40x0",
+        "50+50x0",
+        "75+20x0",
+        "75+40x0",
+        "125+50x0",
+        "150+30x0",
+        "150+50x0",
+    ]
+    for path in sorted(glob.glob(os.path.join(data_dir, "*_range.csv"))):
+        name = os.path.basename(path)[: -len("_range.csv")]
+        source = CsvReplaySource(path, speed=None)
+        liner = LinerTouch(source=source, threaded=False, plot_graph=False)
+        ids = set()
+        while not source.finished:
+            frame = source.read_frame()
+            if frame is not None:
+                ids |= {track.id for track in liner.estimate_frame(frame).tracks}
+        print(f"{name}: {len(ids)} 個の番号")
+        if name in stable:
+            assert len(ids) == 2, f"静止した指の番号が変わった: {name}"
+
@@ -0,0 +1,175 @@
+import logging
+import re
+from collections import namedtuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# LinerTouch.ino の BINARY_FRAME_MODE と合わせる
+# フレームの構成 (リトルエンディアン)
+#   sync(1) | seq(2) | timestamp(4) | count(1) | range(count) | crc8(1)
+# crc8 は seq から range までを多項式 0x07 で計算したもの
+FRAME_SYNC = 0xA5
+# 範囲外 (OoR) のセンサの値
+OUT_OF_RANGE = 255
+# テキストのフレームの先頭に付くフレーム番号と時刻の目印
+FRAME_INFO_PREFIX = "@"
+FRAME_INFO_PATTERN = re.compile(r"@(\d+):(\d+)")
+HEADER_DTYPE = np.dtype(
+    [("sync", "u1"), ("seq", "<u2"), ("timestamp", "<u4"), ("count", "u1")]
+)
+HEADER_SIZE = HEADER_DTYPE.itemsize
+CRC_SIZE = 1
+
+
+def _crc8_table(poly=0x07):
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+# seq: フレーム番号, timestamp: マイコンの micros(), ranges: センサごとの uint8 配列
+# テキストのフレームで FRAME_INFO_OUTPUT が無効な場合 seq と timestamp は None
+# host_time: 記録したデータを再生する場合の受信時刻(sec) (None なら推定時の時刻を使う)
+RawFrame = namedtuple(
+    "RawFrame", ["seq", "timestamp", "ranges", "host_time"], defaults=[None]
+)
+
+
+def parse_ascii_frame(raw_data):
+    """
+    "%3u " / "OoR " 区切りのテキストのフレームを RawFrame に変換する。
+    数値でない値と 255 以上の値は OUT_OF_RANGE にする。
+    先頭の "@<seq>:<micros>" はフレーム番号とマイコンの時刻 (FRAME_INFO_OUTPUT)。
+    先頭が壊れている (ノイズで欠けた) 行はどのセンサの値か分からないため None を返す。
+    """
+    values = raw_data.split()
+    seq = timestamp = None
+    if values and values[0].startswith(FRAME_INFO_PREFIX):
+        match = FRAME_INFO_PATTERN.fullmatch(values.pop(0))
+        if match is None:
+            return None
+        seq, timestamp = int(match[1]), int(match[2])
+    # 数値が範囲外 (区切りが欠けて "100101" のようにつながった値など) は OoR にする
+    ranges = np.array(
+        [
+            int(value) if value.isdigit() and int(value) < OUT_OF_RANGE else OUT_OF_RANGE
+            for value in values
+        ],
+        dtype=np.uint8,
+    )
+    return RawFrame(seq, timestamp, ranges)
+
+
+def encode_binary_frame(seq, timestamp, ranges):
+    """
+    LinerTouch.ino の sendBinaryFrame と同じバイナリのフレームを作る。
+    """
+    ranges = np.asarray(ranges, dtype=np.uint8)
+    header = np.array(
+        [(FRAME_SYNC, seq, timestamp, len(ranges))], dtype=HEADER_DTYPE
+    ).tobytes()
+    body = header[1:] + ranges.tobytes()
+    return header[:1] + body + bytes([crc8(body)])
+
+
+class BinaryFrameDecoder:
+    """
+    バイナリのフレームを受信したバイト列から取り出す。
+    同期バイトと CRC で区切りを判定し、途中から受信した場合やテキストの出力が
+    混ざった場合は次の同期バイトまで読み飛ばす。
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        # CRC が一致せず捨てたフレームの数
+        self.crc_errors = 0
+
+    def feed(self, data):
+        """
+        データを追加し、完成したフレーム (RawFrame) のリストを返す。
+        ranges は受信したバイト列を np.frombuffer で参照したもの。
+        """
+        self.buffer += data
+        frames = []
+        pos = 0
+        while True:
+            pos = self.buffer.find(FRAME_SYNC, pos)
+            if pos < 0 or len(self.buffer) - pos < HEADER_SIZE:
+                break
+            count = self.buffer[pos + HEADER_SIZE - 1]
+            end = pos + HEADER_SIZE + count + CRC_SIZE
+            if len(self.buffer) < end:
+                break
+            frame = bytes(self.buffer[pos:end])
+            if crc8(frame[1:-CRC_SIZE]) != frame[-1]:
+                # 同期バイトがデータの途中だった場合は次の同期バイトから探す
+                self.crc_errors += 1
+                pos += 1
+                continue
+            header = np.frombuffer(frame, dtype=HEADER_DTYPE, count=1)[0]
+            ranges = np.frombuffer(frame, dtype=np.uint8, count=count, offset=HEADER_SIZE)
+            frames.append(
+                RawFrame(int(header["seq"]), int(header["timestamp"]), ranges)
+            )
+            pos = end
+        # 処理済みのバイト (と同期バイトの無いバイト) を捨てる
+        if pos < 0:
+            self.buffer.clear()
+        else:
+            del self.buffer[:pos]
+        return frames
+
+
+class SerialFrameReader:
+    """
+    シリアル通信からバイナリのフレームを読む。SerialLineReader と同じく
+    ser.timeout を設定してブロッキングで読み、読み飛ばしたフレームは dropped に数える。
+    """
+
+    def __init__(self, ser, timeout=0.1):
+        self.ser = ser
+        self.ser.timeout = timeout
+        self.decoder = BinaryFrameDecoder()
+        # 受信したフレームの数
+        self.received = 0
+        # 新しいフレームが届いたため処理せずに捨てたフレームの数
+        self.dropped = 0
+
+    def read_frame(self):
+        """
+        最新の完成したフレームを返す。timeout までに完成しなければ None を返す。
+        """
+        return self.feed(self.ser.read(max(self.ser.in_waiting, 1)))
+
+    def feed(self, data):
+        """
+        受信したデータを追加し、最新の完成したフレームを返す (無ければ None)。
+        """
+        if not data:
+            return None
+        frames = self.decoder.feed(data)
+        if not frames:
+            return None
+        self.received += len(frames)
+        self.dropped += len(frames) - 1
+        return frames[-1]
+
+    def reset(self):
+        self.ser.reset_input_buffer()
+        self.decoder = BinaryFrameDecoder()
@@ -0,0 +1,114 @@
+import numpy as np
+
+from frame_codec import OUT_OF_RANGE
+
+
+class FrameHistory:
+    """
+    過去のフレームを保持する固定長のリングバッファ。
+    センサの測定値は (capacity, sensor_num) の配列で OoR を NaN として保持し、
+    推定位置は (capacity, max_fingers, 2) の配列で指が無い所を NaN として保持する。
+
+    各行を i と i + capacity の2か所に書き込むため、直近 n フレームは
+    常に連続した領域になり、*_window はコピーせずにビューを返す。
+    window の並びは古いものから新しいものの順。
+    """
+
+    def __init__(self, capacity, sensor_num=9, max_fingers=2):
+        self.capacity = capacity
+        self.count = 0
+        # 次に書き込む行
+        self.head = 0
+        self._allocate(sensor_num, max_fingers)
+
+    def _allocate(self, sensor_num, max_fingers):
+        self.sensor_num = sensor_num
+        self.max_fingers = max_fingers
+        self.ranges = np.full((2 * self.capacity, sensor_num), np.nan)
+        self.estimates = np.full((2 * self.capacity, max_fingers, 2), np.nan)
+        self.finger_counts = np.zeros(2 * self.capacity, dtype=int)
+        self.times = np.full(2 * self.capacity, np.nan)
+
+    def _grow_fingers(self, max_fingers):
+        # 指の数が足りない場合は過去の推定位置を残したまま広げる
+        estimates = np.full((2 * self.capacity, max_fingers, 2), np.nan)
+        estimates[:, : self.max_fingers] = self.estimates
+        self.estimates = estimates
+        self.max_fingers = max_fingers
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+        self._allocate(self.sensor_num, self.max_fingers)
+
+    def append(self, ranges, estimated_data, frame_time=None):
+        """
+        1フレーム分のデータを追加する。
+
+        Args:
+            ranges: センサごとの測定値 (uint8 配列, OoR は OUT_OF_RANGE)
+            estimated_data: 推定した指の位置 [x, y] のリスト
+            frame_time: フレームの時刻(sec)
+        """
+        # センサの数が変わった場合は過去のデータと比較できないため捨てる
+        if len(ranges) != self.sensor_num:
+            self.count = 0
+            self.head = 0
+            self._allocate(len(ranges), self.max_fingers)
+        if len(estimated_data) > self.max_fingers:
+            self._grow_fingers(len(estimated_data))
+
+        row = np.where(ranges == OUT_OF_RANGE, np.nan, ranges)
+        estimates = np.full((self.max_fingers, 2), np.nan)
+        if len(estimated_data) > 0:
+            estimates[: len(estimated_data)] = estimated_data
+        for i in (self.head, self.head + self.capacity):
+            self.ranges[i] = row
+            self.estimates[i] = estimates
+            self.finger_counts[i] = len(estimated_data)
+            self.times[i] = np.nan if frame_time is None else frame_time
+        self.head = (self.head + 1) % self.capacity
+        self.count += 1
+
+    def _window(self, buffer, n):
+        n = len(self) if n is None else min(n, len(self))
+        end = self.head + self.capacity
+        return buffer[end - n : end]
+
+    def ranges_window(self, n=None):
+        """直近 n フレームのセンサの測定値 (n, sensor_num) のビュー"""
+        return self._window(self.ranges, n)
+
+    def estimates_window(self, n=None):
+        """直近 n フレームの推定位置 (n, max_fingers, 2) のビュー"""
+        return self._window(self.estimates, n)
+
+    def finger_counts_window(self, n=None):
+        """直近 n フレームの推定した指の数 (n,) のビュー"""
+        return self._window(self.finger_counts, n)
+
+    def times_window(self, n=None):
+        """直近 n フレームの時刻 (n,) のビュー"""
+        return self._window(self.times, n)
+
+    def _row(self, ago):
+        # ago フレーム前 (0 が最新) の行
+        if ago >= len(self):
+            raise IndexError("保存されているフレーム数を超えている")
+        return self.head + self.capacity - 1 - ago
+
+    def has_range(self, ago=0):
+        """ago フレーム前にいずれかのセンサが範囲内だったか"""
+        return not np.isnan(self.ranges[self._row(ago)]).all()
+
+    def finger_count(self, ago=0):
+        """ago フレーム前に推定した指の数"""
+        return int(self.finger_counts[self._row(ago)])
+
+    def estimated_data(self, ago=0):
+        """ago フレーム前の推定位置を [x, y] のリストで返す"""
+        row = self._row(ago)
+        return self.estimates[row, : self.finger_counts[row]].tolist()
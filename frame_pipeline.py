@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+
+
+class LatestQueue:
+    """
+    容量を超えたら古いものから捨てるスレッドセーフなキュー。
+    put は待たないため、取り出す側が遅れても入れる側は止まらない。
+    """
+
+    def __init__(self, maxlen=1):
+        self.items = deque(maxlen=maxlen)
+        self.condition = threading.Condition()
+        # 取り出される前に捨てた数
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        最も古いものを取り出す。timeout までに何も無ければ None を返す。
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items, timeout):
+                return None
+            return self.items.popleft()
+
+
+class StageMetrics:
+    """
+    パイプラインの段ごとの処理件数, 処理時間, 入力キューの深さを記録する。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = 0.0
+        # 読み込みからこの段の処理が終わるまでの時間
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.last_depth = 0
+        self.max_depth = 0
+
+    def record(self, start, end, read_time=None, depth=0):
+        """
+        start, end, read_time は time.perf_counter() の値。
+        """
+        with self.lock:
+            elapsed = end - start
+            self.count += 1
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+            self.last_time = elapsed
+            if read_time is not None:
+                self.last_latency = end - read_time
+                self.max_latency = max(self.max_latency, self.last_latency)
+            self.last_depth = depth
+            self.max_depth = max(self.max_depth, depth)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "mean_time": self.total_time / self.count if self.count else 0.0,
+                "max_time": self.max_time,
+                "last_time": self.last_time,
+                "last_latency": self.last_latency,
+                "max_latency": self.max_latency,
+                "last_depth": self.last_depth,
+                "max_depth": self.max_depth,
+            }
+
+
+def run_stage(queue, handler, metrics, timeout=0.1):
+    """
+    queue から (データ, 読み込み時刻) を取り出して handler を呼ぶ処理をひとつ行う。
+    """
+    item = queue.get(timeout)
+    if item is None:
+        return
+    data, read_time = item
+    depth = len(queue)
+    start = time.perf_counter()
+    handler(data, read_time)
+    metrics.record(start, time.perf_counter(), read_time, depth)
@@ -0,0 +1,404 @@
+import csv
+import glob
+import json
+import logging
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import serial
+
+from frame_codec import (
+    CRC_SIZE,
+    HEADER_DTYPE,
+    HEADER_SIZE,
+    OUT_OF_RANGE,
+    RawFrame,
+    SerialFrameReader,
+    crc8,
+    encode_binary_frame,
+    parse_ascii_frame,
+)
+from frame_timing import MICROS_MODULO, SEQ_MODULO, ClockOffsetEstimator
+from serial_reader import SerialLineReader
+
+logger = logging.getLogger(__name__)
+
+# フレームの記録ファイルの先頭
+# 以降は 受信時刻(<d, sec) | バイナリのフレーム (frame_codec と同じ形式) の繰り返し
+FRAME_LOG_MAGIC = b"LTLOG1\n"
+HOST_TIME_STRUCT = struct.Struct("<d")
+
+
+class SerialSource:
+    """
+    シリアル通信から RawFrame を読むフレームの入力元。
+    LinerTouch.ino の BINARY_FRAME_MODE に合わせて binary_frame を指定する。
+    """
+
+    # シリアル通信は終わらない
+    finished = False
+
+    def __init__(self, port="COM9", baudrate=115200, binary_frame=False, ser=None):
+        # ser を渡した場合はそれを使う (serial_for_url で開いたものなど)
+        if ser is None:
+            ser = serial.Serial(port=port, baudrate=baudrate)
+        self.ser = ser
+        self.binary_frame = binary_frame
+        # 最後にデータが届いた時刻 (time.perf_counter(), 待ち時間を除いた処理時間を計るため)
+        self.received_time = time.perf_counter()
+        # 読み飛ばしたフレーム数は dropped で確認できる
+        if self.binary_frame:
+            self.reader = SerialFrameReader(self.ser)
+        else:
+            self.reader = SerialLineReader(self.ser)
+
+    @property
+    def dropped(self):
+        return self.reader.dropped
+
+    def reset(self):
+        self.reader.reset()
+
+    def close(self):
+        self.ser.close()
+
+    def fileno(self):
+        """
+        selector に登録するファイル記述子 (Windows や loop:// では使えない)。
+        """
+        return self.ser.fileno()
+
+    def read_frame(self):
+        """
+        1フレーム (RawFrame) を読む。timeout までに完成しなければ None を返す。
+        """
+        # 少なくとも1バイト届くまで (または timeout まで) ブロッキングで待つ
+        data = self.ser.read(max(self.ser.in_waiting, 1))
+        self.received_time = time.perf_counter()
+        if self.binary_frame:
+            return self.reader.feed(data)
+        return self.parse_line(self.reader.feed(data))
+
+    def read_available(self):
+        """
+        受信済みのデータだけを読み、完成した最新のフレームを返す (無ければ None)。
+        待たずに返るため、複数の入力元を1つのスレッドで読む場合に使う。
+        """
+        waiting = self.ser.in_waiting
+        data = self.ser.read(waiting) if waiting else b""
+        if self.binary_frame:
+            return self.reader.feed(data)
+        return self.parse_line(self.reader.feed(data))
+
+    def parse_line(self, raw_line):
+        # 改行コードが無ければデータが未完成のため次回へ
+        if raw_line is None:
+            return None
+        raw_data = raw_line.decode("utf-8", errors="ignore")
+        # コンマはセンサ側のオフセットの処理なので次回へ
+        if "," in raw_data:
+            return None
+        # スペースで区切ってデータをリストに変換
+        frame = parse_ascii_frame(raw_data)
+        # 壊れた行は読み飛ばした行として数える
+        if frame is None:
+            self.reader.dropped += 1
+        return frame
+
+
+class MergedSource:
+    """
+    複数のボードの入力元のフレームを時刻で揃え、センサを順につなげた1つのフレームにする。
+    ボードごとの読み込みスレッドでマイコンの時刻をボードごとにホストの時刻に直し、
+    すべてのボードが届いている最も新しい時刻に最も近いフレームをボードごとに選ぶ。
+    timeout(sec) の間フレームが届かないボードは待たずに OoR で埋める。
+
+    sources: ボードごとの入力元 (バーの左から順)
+    sensor_nums: ボードごとのセンサの数
+    threaded: False の場合は読み込みスレッドを起動しない
+        (device_manager.DeviceManager が読んだフレームを add で渡し、poll_frame で取り出す)
+    """
+
+    finished = False
+
+    def __init__(
+        self, sources, sensor_nums, timeout=0.5, buffer_size=4, threaded=True
+    ):
+        self.sources = list(sources)
+        self.sensor_nums = list(sensor_nums)
+        self.timeout = timeout
+        self.clocks = [ClockOffsetEstimator() for _ in self.sources]
+        # ボードごとの (ホストの時刻に直した時刻, RawFrame)
+        self.buffers = [deque(maxlen=buffer_size) for _ in self.sources]
+        self.last_seen = [time.monotonic()] * len(self.sources)
+        self.condition = threading.Condition()
+        self.seq = 0
+        # 最後にフレームが揃った時刻 (SerialSource.received_time と同じ)
+        self.received_time = time.perf_counter()
+        self.stop = threading.Event()
+        self.threads = []
+        if threaded:
+            self.threads = [
+                threading.Thread(target=self._read, args=(i,), daemon=True)
+                for i in range(len(self.sources))
+            ]
+        for thread in self.threads:
+            thread.start()
+
+    @property
+    def dropped(self):
+        return sum(source.dropped for source in self.sources)
+
+    def reset(self):
+        with self.condition:
+            for buffer in self.buffers:
+                buffer.clear()
+        for source in self.sources:
+            source.reset()
+
+    def close(self):
+        self.stop.set()
+        for source in self.sources:
+            source.close()
+
+    def _read(self, i):
+        source = self.sources[i]
+        while not self.stop.is_set():
+            frame = source.read_frame()
+            if frame is not None:
+                self.add(i, frame)
+
+    def add(self, i, frame):
+        """
+        i 番目のボードのフレーム (RawFrame) を追加する。
+        """
+        clock = self.clocks[i]
+        host_time = frame.host_time if frame.host_time is not None else time.time()
+        frame_time = host_time
+        if frame.timestamp is not None:
+            device_time = clock.unwrap(frame.timestamp)
+            clock.update(device_time, host_time)
+            frame_time = clock.to_host_time(device_time)
+        with self.condition:
+            self.buffers[i].append((frame_time, frame))
+            self.last_seen[i] = time.monotonic()
+            self.condition.notify()
+
+    def _waiting(self):
+        # フレームを待っているボードのうち最も早く timeout になる時刻 (無ければ None)
+        deadlines = [
+            last_seen + self.timeout
+            for buffer, last_seen in zip(self.buffers, self.last_seen)
+            if not buffer
+        ]
+        now = time.monotonic()
+        deadlines = [deadline for deadline in deadlines if deadline > now]
+        return min(deadlines) - now if deadlines else None
+
+    def read_frame(self):
+        """
+        動いているすべてのボードのフレームが揃ったら1フレーム (RawFrame) を返す。
+        timeout までに1つも届かなければ None を返す。
+        つなげたフレームはマイコンの時刻を持たず、host_time に揃えた時刻を持つ。
+        """
+        with self.condition:
+            if not any(self.buffers):
+                self.condition.wait(self.timeout)
+            while True:
+                remaining = self._waiting()
+                if remaining is None:
+                    break
+                self.condition.wait(remaining)
+            if not any(self.buffers):
+                return None
+            self.received_time = time.perf_counter()
+            return self._merge()
+
+    def poll_frame(self):
+        """
+        待たずに read_frame と同じフレームを返す。揃っていなければ None を返す。
+        """
+        with self.condition:
+            if not any(self.buffers) or self._waiting() is not None:
+                return None
+            return self._merge()
+
+    def _merge(self):
+        # condition を取得した状態で呼ぶ
+        # すべてのボードのフレームが届いている時刻
+        ref = min(buffer[-1][0] for buffer in self.buffers if buffer)
+        parts = []
+        times = []
+        for buffer, sensor_num in zip(self.buffers, self.sensor_nums):
+            ranges = np.full(sensor_num, OUT_OF_RANGE, dtype=np.uint8)
+            if buffer:
+                t, frame = min(buffer, key=lambda item: abs(item[0] - ref))
+                # 選んだフレームまでは使い終わったものとして捨てる
+                while buffer and buffer[0][0] <= t:
+                    buffer.popleft()
+                # ボードのセンサの数と合わない場合は切り詰めるか OoR で埋める
+                count = min(len(frame.ranges), sensor_num)
+                ranges[:count] = frame.ranges[:count]
+                times.append(t)
+            parts.append(ranges)
+        seq = self.seq % SEQ_MODULO
+        self.seq += 1
+        return RawFrame(seq, None, np.concatenate(parts), host_time=max(times))
+
+
+class ReplaySource:
+    """
+    記録したフレームを再生するフレームの入力元。
+    記録時の受信時刻の間隔に合わせて read_frame を待たせる。
+
+    speed: 1.0 で記録時と同じ速さ, N で N 倍速, None (または 0) で待たずに返す
+    再生したフレームの host_time は再生を始めた時刻に記録時の経過時間を足したもの
+    (speed によらず記録時と同じ間隔になる)。
+    """
+
+    def __init__(self, records, speed=1.0):
+        # (受信時刻(sec), RawFrame) のリスト
+        self.records = list(records)
+        self.speed = speed
+        self.dropped = 0
+        # 再生の時刻まで待ち終えた時刻 (SerialSource.received_time と同じ)
+        self.received_time = time.perf_counter()
+        self.reset()
+
+    @property
+    def finished(self):
+        return self.index >= len(self.records)
+
+    def reset(self):
+        self.index = 0
+        self.start_wall = time.perf_counter()
+        self.start_host = time.time()
+
+    def close(self):
+        pass
+
+    def read_frame(self):
+        if self.finished:
+            return None
+        record_time, frame = self.records[self.index]
+        elapsed = record_time - self.records[0][0]
+        if self.speed:
+            delay = self.start_wall + elapsed / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.received_time = time.perf_counter()
+        self.index += 1
+        return frame._replace(host_time=self.start_host + elapsed)
+
+
+def read_range_csv(path, sensor_ratio=10, sensor_num=10):
+    """
+    GetData_exp1.py などで記録した *_range.csv を読み、フレームごとの
+    センサの測定値 (uint8 配列, OoR は OUT_OF_RANGE) のリストを返す。
+    各行は range_data ("[x, 測定値]" の並び) で、空の行はすべて OoR のフレーム。
+    sensor_num はバーのセンサの数。None の場合はファイル中の最大の x から求めるが、
+    ファイルごとに数 (推定の x の範囲) が変わるため必要な場合だけ使う。
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = [[json.loads(cell) for cell in row] for row in csv.reader(f)]
+    if sensor_num is None:
+        max_x = max((x for row in rows for x, _ in row), default=0)
+        sensor_num = round(max_x / sensor_ratio) + 1
+    frames = []
+    for row in rows:
+        ranges = np.full(sensor_num, OUT_OF_RANGE, dtype=np.uint8)
+        for x, value in row:
+            ranges[round(x / sensor_ratio)] = value
+        frames.append(ranges)
+    return frames
+
+
+class CsvReplaySource(ReplaySource):
+    """
+    *_range.csv を再生するフレームの入力元。
+    ファイルに時刻が無いため frame_interval(sec) ごとのフレームとし、
+    フレーム番号とマイコンの時刻もそれに合わせて付ける。
+
+    paths: ファイルのパスまたはそのリスト (glob のパターンも可)
+    """
+
+    def __init__(
+        self, paths, sensor_ratio=10, sensor_num=10, frame_interval=0.02, speed=1.0
+    ):
+        if isinstance(paths, str):
+            paths = sorted(glob.glob(paths))
+        records = []
+        for path in paths:
+            for ranges in read_range_csv(path, sensor_ratio, sensor_num):
+                i = len(records)
+                t = i * frame_interval
+                frame = RawFrame(
+                    i % SEQ_MODULO, round(t * 1e6) % MICROS_MODULO, ranges
+                )
+                records.append((t, frame))
+        super().__init__(records, speed)
+
+
+class FrameLogWriter:
+    """
+    受信したフレームを受信時刻と共に記録する (LogReplaySource で再生できる)。
+    フレーム番号やマイコンの時刻が無いフレームは、記録した順番と受信時刻で補う。
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(FRAME_LOG_MAGIC)
+        self.count = 0
+
+    def write(self, frame, host_time):
+        seq = self.count % SEQ_MODULO if frame.seq is None else frame.seq
+        timestamp = frame.timestamp
+        if timestamp is None:
+            timestamp = round(host_time * 1e6) % MICROS_MODULO
+        self.file.write(HOST_TIME_STRUCT.pack(host_time))
+        self.file.write(encode_binary_frame(seq, timestamp, frame.ranges))
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_frame_log(path):
+    """
+    FrameLogWriter で記録したファイルを読み、(受信時刻, RawFrame) のリストを返す。
+    途中で壊れている場合はそこまでを返す。
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(FRAME_LOG_MAGIC):
+        raise ValueError(f"フレームの記録ファイルではない: {path}")
+    records = []
+    pos = len(FRAME_LOG_MAGIC)
+    while pos + HOST_TIME_STRUCT.size + HEADER_SIZE <= len(data):
+        (host_time,) = HOST_TIME_STRUCT.unpack_from(data, pos)
+        pos += HOST_TIME_STRUCT.size
+        header = np.frombuffer(data, dtype=HEADER_DTYPE, count=1, offset=pos)[0]
+        end = pos + HEADER_SIZE + int(header["count"]) + CRC_SIZE
+        if end > len(data) or crc8(data[pos + 1 : end - CRC_SIZE]) != data[end - 1]:
+            logger.warning(f"{path} の {pos} バイト目以降が壊れている")
+            break
+        ranges = np.frombuffer(
+            data, dtype=np.uint8, count=int(header["count"]), offset=pos + HEADER_SIZE
+        )
+        records.append(
+            (host_time, RawFrame(int(header["seq"]), int(header["timestamp"]), ranges))
+        )
+        pos = end
+    return records
+
+
+class LogReplaySource(ReplaySource):
+    """
+    FrameLogWriter で記録したファイルを記録時の受信間隔で再生するフレームの入力元。
+    """
+
+    def __init__(self, path, speed=1.0):
+        super().__init__(read_frame_log(path), speed)
@@ -0,0 +1,93 @@
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# LinerTouch.ino のフレーム番号 (uint16_t) と micros() (uint32_t) の周期
+SEQ_MODULO = 1 << 16
+MICROS_MODULO = 1 << 32
+
+
+class SequenceTracker:
+    """
+    フレーム番号の欠落を検出する。
+    """
+
+    def __init__(self, modulo=SEQ_MODULO):
+        self.modulo = modulo
+        self.last_seq = None
+        # 欠落が起きた回数
+        self.gaps = 0
+        # 欠落したフレームの合計数
+        self.lost = 0
+
+    def update(self, seq):
+        """
+        フレーム番号を追加し、直前のフレームとの間で欠落したフレーム数を返す。
+        """
+        lost = 0
+        if self.last_seq is not None:
+            lost = (seq - self.last_seq - 1) % self.modulo
+            if lost:
+                self.gaps += 1
+                self.lost += lost
+                logger.debug("フレーム欠落: %d -> %d", self.last_seq, seq)
+        self.last_seq = seq
+        return lost
+
+
+class ClockOffsetEstimator:
+    """
+    マイコンの micros() とホストの時刻の差を推定する。
+    通信の遅延は常に正なので、直近 window フレームの (ホスト時刻 - マイコン時刻) の
+    最小値を遅延が最も小さかったフレームのオフセットとみなす。
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        # (フレーム番号, オフセット) を最小値が先頭に来るように保持
+        self.offsets = deque()
+        self.count = 0
+        self.last_micros = None
+        self.wraps = 0
+
+    def unwrap(self, micros):
+        """
+        32bit で一周する micros() を秒単位の単調増加する時刻に変換する。
+        """
+        if self.last_micros is not None and micros < self.last_micros:
+            self.wraps += 1
+        self.last_micros = micros
+        return (self.wraps * MICROS_MODULO + micros) / 1e6
+
+    def update(self, device_time, host_time):
+        """
+        device_time (unwrap 済みの秒) と受信時のホスト時刻を追加し、オフセットを返す。
+        """
+        offset = host_time - device_time
+        # 窓の中の最小値を O(1) で求めるため、新しい値以上のものは捨てる
+        while self.offsets and self.offsets[-1][1] >= offset:
+            self.offsets.pop()
+        self.offsets.append((self.count, offset))
+        while self.offsets[0][0] <= self.count - self.window:
+            self.offsets.popleft()
+        self.count += 1
+        return self.offset
+
+    @property
+    def offset(self):
+        if not self.offsets:
+            return None
+        return self.offsets[0][1]
+
+    def to_host_time(self, device_time):
+        """
+        マイコンの時刻をホストの時刻に変換する。
+        """
+        return device_time + self.offset
+
+    def latency(self, device_time, host_time):
+        """
+        最も速く届いたフレームを基準にした、そのフレームの通信の遅延 (秒)。
+        """
+        return host_time - self.to_host_time(device_time)
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    HDR Histogram と同じく、2の累乗ごとの区間を 2^(significant_bits - 1) 個に
+    等分したバケットで値を数えるヒストグラム。
+    相対誤差は 2^-(significant_bits - 1) 以下で、記録は定数時間でメモリも小さい。
+    """
+
+    def __init__(self, significant_bits=5, unit=None):
+        self.significant_bits = significant_bits
+        # 処理時間の場合は "ns"
+        self.unit = unit
+        self.half = 1 << (significant_bits - 1)
+        self.counts = [0] * (2 * self.half)
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def bucket_index(self, value):
+        shift = value.bit_length() - self.significant_bits
+        if shift <= 0:
+            return value
+        return shift * self.half + (value >> shift)
+
+    def bucket_value(self, index):
+        # バケットの下限の値
+        if index < 2 * self.half:
+            return index
+        shift = index // self.half - 1
+        return (index - shift * self.half) << shift
+
+    def record(self, value):
+        """
+        0 以上の整数の値 (処理時間(ns) や反復回数) を記録する。
+        """
+        index = self.bucket_index(value)
+        with self.lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, p, counts=None, count=None):
+        counts = self.counts if counts is None else counts
+        count = self.count if count is None else count
+        if count == 0:
+            return 0
+        rank = max(1, round(p / 100 * count))
+        seen = 0
+        for index, n in enumerate(counts):
+            seen += n
+            if seen >= rank:
+                # 幅のあるバケットは上限と下限の中間を返す
+                low = self.bucket_value(index)
+                high = self.bucket_value(index + 1)
+                if high - low <= 1:
+                    return low
+                return min((low + high) / 2, self.max)
+        return self.max
+
+    def snapshot(self, percentiles=(50, 90, 99, 99.9)):
+        with self.lock:
+            counts = list(self.counts)
+            count = self.count
+            total = self.total
+            minimum = self.min
+            maximum = self.max
+        if count == 0:
+            return {"count": 0, "unit": self.unit}
+        result = {"count": count, "unit": self.unit}
+        result["mean"] = total / count
+        result["min"] = minimum
+        for p in percentiles:
+            result[f"p{p:g}"] = self.percentile(p, counts, count)
+        result["max"] = maximum
+        return result
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (2 * self.half)
+            self.count = 0
+            self.total = 0
+            self.min = None
+            self.max = None
+
+
+class Registry:
+    """
+    名前ごとのヒストグラムとカウンタを保持する。
+    推定のスレッドでは記録だけを行い、集計は snapshot や dump を呼んだ側で行う。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.dump_thread = None
+        self.dump_stop = threading.Event()
+
+    def histogram(self, name, unit=None):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(unit=unit))
+        return histogram
+
+    def record(self, name, value, unit=None):
+        self.histogram(name, unit).record(value)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name=None):
+        """
+        関数の処理時間(ns) を name (省略時は関数の修飾名) のヒストグラムに
+        記録するデコレータ。
+        """
+
+        def decorator(func):
+            histogram = self.histogram(name or func.__qualname__, "ns")
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.record(time.perf_counter_ns() - start)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self):
+        """
+        ヒストグラムごとの件数, 平均, パーセンタイル, 最大とカウンタの値を返す。
+        """
+        with self.lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+        return {
+            "histograms": {
+                name: histogram.snapshot() for name, histogram in histograms.items()
+            },
+            "counters": counters,
+        }
+
+    def reset(self):
+        with self.lock:
+            histograms = list(self.histograms.values())
+            self.counters = {name: 0 for name in self.counters}
+        for histogram in histograms:
+            histogram.reset()
+
+    def dump(self, sink=None):
+        """
+        snapshot を1行ずつ sink (省略時は logger.info) に出力する。
+        処理時間のヒストグラムは us 単位で出力する。
+        """
+        sink = sink or logger.info
+        snapshot = self.snapshot()
+        for name, stats in sorted(snapshot["histograms"].items()):
+            if stats["count"] == 0:
+                continue
+            scale, unit = (1e3, "us") if stats["unit"] == "ns" else (1, "")
+            values = " ".join(
+                f"{key}={stats[key] / scale:.1f}"
+                for key in stats
+                if key not in ("count", "unit")
+            )
+            sink(f"{name}: count={stats['count']} {values} {unit}".rstrip())
+        for name, value in sorted(snapshot["counters"].items()):
+            sink(f"{name}: {value}")
+
+    def start_dump(self, interval=10.0, sink=None):
+        """
+        interval(sec) ごとに dump を呼ぶスレッドを起動する。
+        """
+        self.stop_dump()
+        self.dump_stop.clear()
+
+        def run():
+            while not self.dump_stop.wait(interval):
+                self.dump(sink)
+
+        self.dump_thread = threading.Thread(target=run, daemon=True)
+        self.dump_thread.start()
+
+    def stop_dump(self):
+        if self.dump_thread is not None:
+            self.dump_stop.set()
+            self.dump_thread.join()
+            self.dump_thread = None
+
+
+# LinerTouch などが共有する既定のレジストリ
+registry = Registry()
+timed = registry.timed
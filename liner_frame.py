@@ -0,0 +1,75 @@
+class Frame:
+    """
+    LinerTouch が処理した1フレーム分のデータ。作成後は変更できない。
+    LinerTouch.frame は処理が終わるたびに新しい Frame に置き換わるため、
+    別のスレッドからは一度 frame を取り出せば同じフレームの値を読める。
+
+    seq: フレーム番号 (無い場合は None)
+    device_time: マイコンの時刻(sec) (無い場合は None)
+    host_time: ホストの受信時刻(sec)
+    frame_time: センサの値を取得した時刻をホストの時刻で表したもの(sec)
+    ranges: センサごとの測定値 (uint8 配列, OoR は OUT_OF_RANGE)
+    range_data: [x, 測定値] のリスト (OoR は除く)
+    estimated_data: 推定した指の位置 [x, y] のリスト
+    tap_flag: タップ (リリース後の待ち) 中か
+    pinch_dist: ピンチ中の2本指の距離 (ピンチ中でなければ None)
+    tracks: 番号を付けて追跡している指 (finger_tracker.TrackState) のリスト
+    """
+
+    __slots__ = (
+        "seq",
+        "device_time",
+        "host_time",
+        "frame_time",
+        "ranges",
+        "range_data",
+        "estimated_data",
+        "tap_flag",
+        "pinch_dist",
+        "tracks",
+    )
+
+    def __init__(
+        self,
+        seq=None,
+        device_time=None,
+        host_time=None,
+        frame_time=None,
+        ranges=None,
+        range_data=(),
+        estimated_data=(),
+        tap_flag=False,
+        pinch_dist=None,
+        tracks=(),
+    ):
+        set_value = object.__setattr__
+        set_value(self, "seq", seq)
+        set_value(self, "device_time", device_time)
+        set_value(self, "host_time", host_time)
+        set_value(self, "frame_time", frame_time)
+        set_value(self, "ranges", ranges)
+        set_value(self, "range_data", range_data)
+        set_value(self, "estimated_data", estimated_data)
+        set_value(self, "tap_flag", tap_flag)
+        set_value(self, "pinch_dist", pinch_dist)
+        set_value(self, "tracks", tracks)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Frame は変更できない")
+
+    def __delattr__(self, name):
+        raise AttributeError("Frame は変更できない")
+
+    def replace(self, **kwargs):
+        """
+        一部の値を変更した新しい Frame を返す。
+        """
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(kwargs)
+        return Frame(**values)
+
+    def __repr__(self):
+        return (
+            f"Frame(seq={self.seq}, frame_time={self.frame_time}, "
+            f"range_data={self.range_data}, estimated_data={self.estimated_data})"
+        )
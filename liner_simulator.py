@@ -0,0 +1,219 @@
+import argparse
+import logging
+import math
+import os
+import random
+import threading
+import time
+
+import numpy as np
+import serial
+
+from frame_codec import OUT_OF_RANGE, encode_binary_frame
+from frame_timing import MICROS_MODULO, SEQ_MODULO
+
+logger = logging.getLogger(__name__)
+
+
+class Finger:
+    """
+    シミュレータの指。中心 (x, y) を周期 period(sec) で sin 波状に動かす。
+    """
+
+    def __init__(self, x, y, amp_x=0.0, amp_y=0.0, period=2.0, phase=0.0):
+        self.x = x
+        self.y = y
+        self.amp_x = amp_x
+        self.amp_y = amp_y
+        self.period = period
+        self.phase = phase
+
+    def position(self, t):
+        angle = 2 * math.pi * t / self.period + self.phase
+        wave = math.sin(angle)
+        return self.x + self.amp_x * wave, self.y + self.amp_y * wave
+
+
+class FingerModel:
+    """
+    指の位置からセンサの測定値を作る。
+    plot_data の円弧と同じく、センサは真上から ±half_angle 度の範囲を測り、
+    測定値はセンサから指の中心までの距離から指の半径を引いたものとする。
+    """
+
+    def __init__(
+        self,
+        fingers,
+        sensor_num=10,
+        sensor_ratio=10,
+        finger_radius=14.9 / 2,
+        half_angle=12.5,
+        max_range=200,
+        noise=0.0,
+    ):
+        self.fingers = fingers
+        self.sensor_x = np.arange(sensor_num) * sensor_ratio
+        self.finger_radius = finger_radius
+        self.half_angle = np.radians(half_angle)
+        # これより遠い場合は OoR
+        self.max_range = max_range
+        # 測定値に加える正規分布の雑音の標準偏差(mm)
+        self.noise = noise
+
+    def ranges(self, t):
+        """
+        時刻 t(sec) のセンサごとの測定値 (uint8 配列, OoR は OUT_OF_RANGE) を返す。
+        """
+        ranges = np.full(len(self.sensor_x), np.inf)
+        for finger in self.fingers:
+            x, y = finger.position(t)
+            dx = x - self.sensor_x
+            dist = np.hypot(dx, y)
+            # 指の一部でも測定範囲の角度に入っていれば測れる
+            margin = np.arcsin(np.minimum(self.finger_radius / dist, 1.0))
+            visible = np.abs(np.arctan2(dx, y)) <= self.half_angle + margin
+            ranges = np.where(
+                visible, np.minimum(ranges, dist - self.finger_radius), ranges
+            )
+        if self.noise:
+            ranges += np.random.normal(0.0, self.noise, len(ranges))
+        ranges = np.round(np.maximum(ranges, 0.0))
+        return np.where(ranges <= self.max_range, ranges, OUT_OF_RANGE).astype(np.uint8)
+
+
+class FirmwareSimulator:
+    """
+    LinerTouch.ino の出力を真似て port に書き込む。
+    起動時にキャリブレーションのオフセットをコンマ区切りで2行出力し、
+    以降は interval(sec) ごとに "%3u " / "OoR " 区切りのフレームを出力する。
+
+    port: write を持つもの (serial_for_url("loop://") や pty のマスター側)
+    frame_info: FRAME_INFO_OUTPUT と同じく "@<seq>:<micros> " を先頭に付けるか
+    binary: BINARY_FRAME_MODE と同じくバイナリのフレームで出力するか
+    loss: フレームを送らずにフレーム番号だけ進める確率 (取りこぼしの確認用)
+    """
+
+    def __init__(
+        self,
+        port,
+        model,
+        interval=0.05,
+        frame_info=True,
+        binary=False,
+        loss=0.0,
+    ):
+        self.port = port
+        self.model = model
+        self.interval = interval
+        self.frame_info = frame_info
+        self.binary = binary
+        self.loss = loss
+        self.seq = 0
+        # 送ったフレームの数
+        self.sent = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def calibration_lines(self):
+        sensor_num = len(self.model.sensor_x)
+        offsets = "".join(f"{random.randint(0, 30):3d}," for _ in range(sensor_num))
+        checks = "".join(f"{random.randint(-2, 2):3d}," for _ in range(sensor_num))
+        return f"{offsets}\r\n{checks}\r\n".encode()
+
+    def frame_bytes(self, ranges, micros):
+        if self.binary:
+            return encode_binary_frame(self.seq, micros, ranges)
+        values = [
+            "OoR " if value == OUT_OF_RANGE else f"{value:3d} " for value in ranges
+        ]
+        info = f"@{self.seq}:{micros} " if self.frame_info else ""
+        return (info + "".join(values) + "\r\n").encode()
+
+    def run(self):
+        if not self.binary:
+            self.port.write(self.calibration_lines())
+        start = time.perf_counter()
+        next_time = start
+        while self.running:
+            now = time.perf_counter()
+            if not self.loss or random.random() >= self.loss:
+                micros = round((now - start) * 1e6) % MICROS_MODULO
+                ranges = self.model.ranges(now - start)
+                self.port.write(self.frame_bytes(ranges, micros))
+                self.sent += 1
+            self.seq = (self.seq + 1) % SEQ_MODULO
+            next_time += self.interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def open_loopback(timeout=0.1):
+    """
+    書き込んだデータをそのまま読める仮想のシリアルポートを開く。
+    FirmwareSimulator と frame_source.SerialSource(ser=...) の両方に渡して使う。
+    """
+    return serial.serial_for_url("loop://", timeout=timeout)
+
+
+def open_pty():
+    """
+    擬似端末を開き (マスター側のファイル, スレーブ側のパス) を返す (Linux, macOS)。
+    スレーブ側のパスは serial.Serial(port=...) で開ける。
+    """
+    master, slave = os.openpty()
+    return os.fdopen(master, "wb", buffering=0), os.ttyname(slave)
+
+
+def default_model(noise=1.0):
+    # 2本の指が左右に往復する
+    return FingerModel(
+        [
+            Finger(25, 50, amp_x=20, period=2.0),
+            Finger(70, 40, amp_x=15, amp_y=10, period=3.0, phase=math.pi),
+        ],
+        noise=noise,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(levelname)s] %(name)s: %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="LinerTouch.ino の出力を擬似端末に流す")
+    parser.add_argument("--interval", type=float, default=0.05, help="フレーム間隔(sec)")
+    parser.add_argument("--binary", action="store_true", help="バイナリのフレームで出力")
+    parser.add_argument(
+        "--no-frame-info", action="store_true", help="@seq:micros を付けない"
+    )
+    parser.add_argument("--loss", type=float, default=0.0, help="フレームを送らない確率")
+    parser.add_argument("--noise", type=float, default=1.0, help="測定値の雑音(mm)")
+    args = parser.parse_args()
+
+    port, path = open_pty()
+    logger.info(f"擬似端末: {path}")
+    simulator = FirmwareSimulator(
+        port,
+        default_model(args.noise),
+        interval=args.interval,
+        frame_info=not args.no_frame_info,
+        binary=args.binary,
+        loss=args.loss,
+    )
+    simulator.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,121 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import patches
+from matplotlib.lines import Line2D
+
+# センサの測定範囲 (真上から ±12.5 度)
+ARC_THETA = (90 - 12.5, 90 + 12.5)
+
+
+class LivePlot:
+    """
+    センサの測定値, 円弧, 推定位置を表示するグラフ。
+    軸や凡例は最初に一度だけ描画して背景として保存し、フレームごとには
+    点と円弧のデータだけを書き換えてブリッティングで描き直す。
+    """
+
+    def __init__(self, x_bounds, sensor_ratio, sensor_height, finger_radius):
+        self.sensor_ratio = sensor_ratio
+        self.sensor_height = sensor_height
+        self.finger_radius = finger_radius
+        self.fig, self.ax = plt.subplots()
+        self.ax.set_aspect("equal")
+        self.ax.set_ylim(0, sensor_height)
+        self.ax.set_xlabel("X")
+        self.ax.set_ylabel("Y")
+        self.ax.set_title("Sensor Data, Estimated Position, and Arcs")
+        # 動的な要素は animated=True にして背景に含めない
+        self.sensor_points = self.ax.scatter(
+            [], [], color="blue", label="Sensor Data", animated=True
+        )
+        self.estimated_points = self.ax.scatter(
+            [], [], color="red", animated=True
+        )
+        self.arcs = []
+        self.ax.legend(
+            handles=[
+                self.sensor_points,
+                Line2D(
+                    [],
+                    [],
+                    color="red",
+                    marker="o",
+                    linestyle="",
+                    label="Estimated Position (Intersection)",
+                ),
+                Line2D([], [], color="green", linestyle="--", label="Arcs"),
+            ]
+        )
+        self.set_x_bounds(x_bounds)
+        # ウィンドウの大きさが変わった場合などは背景を取り直す
+        self.fig.canvas.mpl_connect("draw_event", self.on_draw)
+        plt.ion()  # 対話モードをオン
+        plt.show()
+
+    def set_x_bounds(self, x_bounds):
+        """
+        推定位置の x の範囲 (ArrayGeometry.x_bounds) に合わせて軸を設定する。
+        """
+        self.x_bounds = x_bounds
+        x_min, x_max = x_bounds
+        self.ax.set_xlim(x_min - self.sensor_ratio, x_max)
+        self.background = None
+
+    def add_arcs(self, arc_num):
+        # センサごとの円弧 (足りない分だけ作る)
+        while len(self.arcs) < arc_num:
+            arc = patches.Arc(
+                (0, 0),
+                0,
+                0,
+                theta1=ARC_THETA[0],
+                theta2=ARC_THETA[1],
+                edgecolor="green",
+                linestyle="--",
+                animated=True,
+                visible=False,
+            )
+            self.ax.add_patch(arc)
+            self.arcs.append(arc)
+
+    def on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        self.ax.draw_artist(self.sensor_points)
+        for arc in self.arcs:
+            if arc.get_visible():
+                self.ax.draw_artist(arc)
+        self.ax.draw_artist(self.estimated_points)
+
+    def update(self, frame):
+        """
+        フレーム (liner_frame.Frame) の値で点と円弧を更新して描き直す。
+        """
+        range_data = np.asarray(frame.range_data, dtype=float).reshape(-1, 2)
+        self.add_arcs(len(range_data))
+        self.sensor_points.set_offsets(range_data)
+        self.estimated_points.set_offsets(
+            np.asarray(frame.estimated_data, dtype=float).reshape(-1, 2)
+        )
+        for i, arc in enumerate(self.arcs):
+            if i < len(range_data):
+                x0, r0 = range_data[i]
+                diameter = 2 * (r0 + self.finger_radius)
+                arc.set_center((x0, 0))
+                arc.set_width(diameter)
+                arc.set_height(diameter)
+                arc.set_visible(True)
+            else:
+                arc.set_visible(False)
+
+        canvas = self.fig.canvas
+        if self.background is None:
+            # 背景が無い場合は全体を描画し、on_draw で背景を保存する
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            self.draw_artists()
+            canvas.blit(self.ax.bbox)
+        canvas.flush_events()
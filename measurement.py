@@ -23,6 +23,9 @@ def main():
                     ser.readline().decode("utf-8").strip()
                 )  # 1行ずつ読み取り、最後の行を最新のデータとして保持
             range_data = raw_data.split()
+            # 先頭の "@<seq>:<micros>" (FRAME_INFO_OUTPUT) はセンサの値ではないので除く
+            if range_data and range_data[0].startswith("@"):
+                range_data = range_data[1:]
             # データを整数に変換、失敗した場合はそのまま保持
             range_data = [int(r) if r.isdigit() else r for r in range_data]
             data = np.var([int(r) for r in range_data if isinstance(r, int)])
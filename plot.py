@@ -52,6 +52,9 @@ def update_data():
         if ser.in_waiting > 0:
             line = ser.readline().decode("utf-8").rstrip()
             col = line.split()
+            # 先頭の "@<seq>:<micros>" (FRAME_INFO_OUTPUT) はセンサの値ではないので除く
+            if col and col[0].startswith("@"):
+                col = col[1:]
             for i in range(len(col)):
                 if col[i].isdecimal():
                     data[i] = int(col[i])
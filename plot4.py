@@ -59,6 +59,9 @@ def update_data():
             line = ser.readline().decode("utf-8").rstrip()
             ser.reset_input_buffer()
             col = line.split()
+            # 先頭の "@<seq>:<micros>" (FRAME_INFO_OUTPUT) はセンサの値ではないので除く
+            if col and col[0].startswith("@"):
+                col = col[1:]
             sum = []
             for i in range(len(col)):
                 if col[i].isdecimal():
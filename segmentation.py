@@ -0,0 +1,37 @@
+import numpy as np
+
+
+def segment_frame(values, breaks=None):
+    """
+    1フレームの測定値を未検知のセンサで区切ったデータ郡と、データ郡の中の極大値に分ける。
+    データ郡の端は両隣が揃わないため極大値にならない。
+
+    Args:
+        values: センサごとの測定値 ((センサ数,) の ndarray, 未検知は NaN)
+        breaks: 隣のセンサとの間でデータ郡を区切るか ((センサ数 - 1,) の bool 配列,
+            ArrayGeometry.breaks)。省略した場合は未検知のセンサだけで区切る。
+    Returns:
+        (spans, peaks)
+        spans: データ郡ごとの [開始, 終了) のセンサ番号 ((データ郡の数, 2) の ndarray)
+        peaks: 極大値のセンサ番号の ndarray
+    """
+    valid = ~np.isnan(values)
+    # 隣のセンサと同じデータ郡になるか
+    joined = valid[1:] & valid[:-1]
+    if breaks is not None:
+        joined &= ~breaks
+    starts = np.flatnonzero(valid & ~np.r_[False, joined])
+    stops = np.flatnonzero(valid & ~np.r_[joined, False]) + 1
+    spans = np.column_stack((starts, stops))
+    # 両隣と同じデータ郡で、両隣より大きいセンサ
+    diff = np.diff(values)
+    peaks = np.flatnonzero((diff[:-1] > 0) & (diff[1:] < 0) & joined[:-1] & joined[1:])
+    return spans, peaks + 1
+
+
+def local_maxima(range_r):
+    """
+    データ郡の両端を除く極大値の位置を返す。
+    """
+    diff = np.diff(range_r)
+    return np.flatnonzero((diff[:-1] > 0) & (diff[1:] < 0)) + 1
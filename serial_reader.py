@@ -0,0 +1,129 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LineRingBuffer:
+    """
+    受信したバイト列を保持する固定長のリングバッファ。
+    書き込まれたバイトだけ改行を探し、完成した行を取り出す。
+    位置は単調増加する絶対位置で持ち、capacity の剰余で bytearray を参照する。
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        # 未完成の行の先頭
+        self.start = 0
+        # 次に書き込む位置
+        self.end = 0
+        # 1行が capacity を超えて捨てた回数
+        self.overflow = 0
+        # 溢れた行の残りを読み捨てている途中か
+        self.discarding = False
+
+    def __len__(self):
+        return self.end - self.start
+
+    def _slice(self, begin, end):
+        # 絶対位置 [begin, end) のバイト列を取り出す
+        i = begin % self.capacity
+        if i + (end - begin) <= self.capacity:
+            return bytes(self.buffer[i : i + (end - begin)])
+        j = end % self.capacity
+        return bytes(self.buffer[i:]) + bytes(self.buffer[:j])
+
+    def _find_newline(self, begin, end):
+        # 絶対位置 [begin, end) から改行を探す (見つからなければ -1)
+        i = begin % self.capacity
+        if i + (end - begin) <= self.capacity:
+            pos = self.buffer.find(b"\n", i, i + (end - begin))
+            return -1 if pos < 0 else begin + (pos - i)
+        pos = self.buffer.find(b"\n", i)
+        if pos >= 0:
+            return begin + (pos - i)
+        pos = self.buffer.find(b"\n", 0, end % self.capacity)
+        return -1 if pos < 0 else begin + (self.capacity - i) + pos
+
+    def write(self, data):
+        """
+        データを書き込み、新たに完成した行 (改行コードを除く) のリストを返す。
+        """
+        if len(data) > self.capacity:
+            lines = []
+            for i in range(0, len(data), self.capacity):
+                lines += self.write(data[i : i + self.capacity])
+            return lines
+        if not self.discarding and len(self) + len(data) > self.capacity:
+            # 先に行を完成させれば空きができる場合は分けて書き込む
+            pos = data.find(b"\n")
+            if 0 <= pos and len(self) + pos + 1 <= self.capacity:
+                return self.write(data[: pos + 1]) + self.write(data[pos + 1 :])
+        # 未完成の行が溢れる場合は次の改行までその行を捨てる
+        if self.discarding or len(self) + len(data) > self.capacity:
+            if not self.discarding:
+                self.overflow += 1
+            self.start = self.end
+            pos = data.find(b"\n")
+            self.discarding = pos < 0
+            if self.discarding:
+                return []
+            data = data[pos + 1 :]
+
+        scan = self.end
+        i = self.end % self.capacity
+        head = min(len(data), self.capacity - i)
+        self.buffer[i : i + head] = data[:head]
+        self.buffer[: len(data) - head] = data[head:]
+        self.end += len(data)
+
+        lines = []
+        while scan < self.end:
+            pos = self._find_newline(scan, self.end)
+            if pos < 0:
+                break
+            lines.append(self._slice(self.start, pos).rstrip(b"\r"))
+            self.start = scan = pos + 1
+        return lines
+
+
+class SerialLineReader:
+    """
+    シリアル通信から改行区切りの行を読む。
+    ser.timeout を設定してブロッキングで読むため、データが無い間はCPUを使わない。
+    処理が追い付かずに読み飛ばした行は dropped に数える。
+    """
+
+    def __init__(self, ser, capacity=4096, timeout=0.1):
+        self.ser = ser
+        self.ser.timeout = timeout
+        self.ring = LineRingBuffer(capacity)
+        # 受信した行の数
+        self.received = 0
+        # 新しい行が届いたため処理せずに捨てた行の数
+        self.dropped = 0
+
+    def read_line(self):
+        """
+        最新の完成した行を返す。timeout までに行が完成しなければ None を返す。
+        """
+        # 少なくとも1バイト届くまで (または timeout まで) 待つ
+        return self.feed(self.ser.read(max(self.ser.in_waiting, 1)))
+
+    def feed(self, data):
+        """
+        受信したデータを追加し、最新の完成した行を返す (無ければ None)。
+        selector などで読めるようになったデータを渡す場合は待たずに返る。
+        """
+        if not data:
+            return None
+        lines = self.ring.write(data)
+        if not lines:
+            return None
+        self.received += len(lines)
+        self.dropped += len(lines) - 1
+        return lines[-1]
+
+    def reset(self):
+        self.ser.reset_input_buffer()
+        self.ring = LineRingBuffer(self.ring.capacity)
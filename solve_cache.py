@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SolveCache:
+    """
+    データ郡 (range_data) ごとの推定結果を保持する大きさに上限のある LRU キャッシュ。
+    キーは推定に使う値 (指の半径など) と (センサの x 座標, 測定値) の組のタプルで、
+    quantum を指定すると測定値を quantum (mm) 刻みに丸めて近い測定値の結果も使い回す。
+    """
+
+    def __init__(self, maxsize=256, quantum=None):
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.items = OrderedDict()
+        # stats は別のスレッドから読むため
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, range_data, params=()):
+        """
+        params: 推定に使う値のタプル (変わった場合に前の結果を使わないため)
+        """
+        range_data = np.asarray(range_data, dtype=float).reshape(-1, 2)
+        range_r = range_data[:, 1]
+        if self.quantum:
+            range_r = np.rint(range_r / self.quantum).astype(int)
+        return (tuple(params), tuple(zip(range_data[:, 0].tolist(), range_r.tolist())))
+
+    def get(self, key):
+        """
+        キーに対応する結果を返す。無ければ None を返す。
+        """
+        with self.lock:
+            result = self.items.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.items[key] = result
+            self.items.move_to_end(key)
+            if len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.items),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
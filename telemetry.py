@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from frame_codec import OUT_OF_RANGE
+
+logger = logging.getLogger(__name__)
+
+
+def telemetry_dtype(sensor_num, max_fingers):
+    return np.dtype(
+        [
+            ("seq", "<i4"),
+            ("frame_time", "<f8"),
+            ("sensor_num", "u1"),
+            ("ranges", "u1", (sensor_num,)),
+            ("finger_count", "u1"),
+            ("estimates", "<f4", (max_fingers, 2)),
+        ]
+    )
+
+
+def format_record(record):
+    """
+    記録した1フレームを文字列にする。
+    測定値は LinerTouch.ino と同じく OoR を "OoR" で表す。
+    """
+    ranges = record["ranges"][: record["sensor_num"]]
+    values = " ".join("OoR" if v == OUT_OF_RANGE else str(v) for v in ranges)
+    estimates = record["estimates"][: record["finger_count"]]
+    est_pos = "".join(f" est_pos:{x:.0f},{y:.0f}" for x, y in estimates)
+    return f"seq={record['seq']} t={record['frame_time']:.3f} [{values}]{est_pos}"
+
+
+class FrameTelemetry:
+    """
+    フレームごとの測定値と推定位置を固定長のバイナリのリングバッファに記録する。
+    record では文字列を作らず、sink が登録されている場合だけ別のスレッドで
+    flush_interval(sec) ごとに新しいフレームを文字列にして sink に渡す。
+    sink が追い付かずに上書きされたフレームは lost に数える。
+    """
+
+    def __init__(
+        self, capacity=1024, sensor_num=16, max_fingers=4, flush_interval=0.5
+    ):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._allocate(sensor_num, max_fingers)
+        self.sinks = []
+        self.lost = 0
+        self.flush_thread = None
+        self.flush_stop = threading.Event()
+
+    def _allocate(self, sensor_num, max_fingers):
+        dtype = telemetry_dtype(sensor_num, max_fingers)
+        self.records = np.zeros(self.capacity, dtype=dtype)
+        self.sensor_num = sensor_num
+        self.max_fingers = max_fingers
+        # これまでに記録した数と sink に渡した数 (どちらも増え続ける)
+        self.written = 0
+        self.flushed = 0
+
+    def record(self, frame):
+        """
+        1フレーム (liner_frame.Frame) を記録する。
+        """
+        ranges = frame.ranges
+        estimated_data = frame.estimated_data
+        if ranges is None:
+            return
+        with self.lock:
+            # 入りきらない場合は作り直す (それまでの記録は捨てる)
+            sensor_num = max(len(ranges), self.sensor_num)
+            max_fingers = max(len(estimated_data), self.max_fingers)
+            if (sensor_num, max_fingers) != (self.sensor_num, self.max_fingers):
+                self._allocate(sensor_num, max_fingers)
+            row = self.records[self.written % self.capacity]
+            row["seq"] = -1 if frame.seq is None else frame.seq
+            row["frame_time"] = (
+                np.nan if frame.frame_time is None else frame.frame_time
+            )
+            row["sensor_num"] = len(ranges)
+            row["ranges"][: len(ranges)] = ranges
+            row["finger_count"] = len(estimated_data)
+            row["estimates"] = np.nan
+            if len(estimated_data) > 0:
+                row["estimates"][: len(estimated_data)] = estimated_data
+            self.written += 1
+
+    def recent(self, n=None):
+        """
+        直近 n フレームの記録を構造化配列で返す (古いものから順)。
+        """
+        with self.lock:
+            count = min(self.written, self.capacity)
+            n = count if n is None else min(n, count)
+            idx = np.arange(self.written - n, self.written) % self.capacity
+            return self.records[idx].copy()
+
+    def attach(self, sink):
+        """
+        sink (文字列を受け取る関数, logger.info など) を登録し、
+        書き出すスレッドを起動する。
+        登録より前に記録したフレームは渡さない。
+        """
+        with self.lock:
+            self.flushed = self.written
+        self.sinks.append(sink)
+        if self.flush_thread is None:
+            self.flush_stop.clear()
+            self.flush_thread = threading.Thread(target=self._run, daemon=True)
+            self.flush_thread.start()
+
+    def detach(self, sink):
+        self.sinks.remove(sink)
+        if not self.sinks and self.flush_thread is not None:
+            self.flush_stop.set()
+            self.flush_thread.join()
+            self.flush_thread = None
+
+    def _run(self):
+        while not self.flush_stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        前回から記録したフレームを文字列にして sink に渡す。
+        """
+        if not self.sinks:
+            return
+        with self.lock:
+            start = max(self.flushed, self.written - self.capacity)
+            self.lost += start - self.flushed
+            idx = np.arange(start, self.written) % self.capacity
+            records = self.records[idx].copy()
+            self.flushed = self.written
+        for record in records:
+            line = format_record(record)
+            for sink in self.sinks:
+                sink(line)
+
+
+class RateLimitedLog:
+    """
+    同じ警告を interval(sec) に1回だけ出力し、その間に抑えた件数を次の出力に付ける。
+    引数は logging と同じく出力する場合だけ文字列にする。
+    """
+
+    def __init__(self, logger, interval=1.0):
+        self.logger = logger
+        self.interval = interval
+        self.last_time = None
+        self.suppressed = 0
+
+    def log(self, level, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        if self.last_time is not None and now - self.last_time < self.interval:
+            self.suppressed += 1
+            return
+        if self.suppressed:
+            msg += " (他 %d 件)"
+            args += (self.suppressed,)
+        self.logger.log(level, msg, *args)
+        self.last_time = now
+        self.suppressed = 0
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
@@ -0,0 +1,138 @@
+import threading
+
+# 画面の更新間隔 (ms, 約 60 Hz)
+REFRESH_INTERVAL = 16
+# センサのスレッドからメインループを起こす仮想イベント
+WAKE_EVENT = "<<TkCallbackBridgeWake>>"
+
+
+class TkCallbackBridge:
+    """
+    LinerTouch のコールバックのスレッドから Tk のメインループへ処理を渡す。
+    センサのスレッドではキューに積んで仮想イベントでメインループを起こすだけにし、
+    メインループ側で refresh_interval(ms) ごとにまとめて呼ばれた順に実行する。
+    キューが空の間はメインループを起こさない。
+
+    - coalesce で包んだコールバック (update_callback など) は、
+      次の post の呼び出しまでに何度呼ばれても最新の1回だけを実行する
+    - post で包んだコールバック (タップやピンチ) は呼ばれた順にすべて実行する
+
+    センサのスレッドから event_generate を呼ぶため、スレッド対応の Tcl/Tk が必要
+    (python.org の配布物などは対応している)。
+    """
+
+    def __init__(self, widget, refresh_interval=REFRESH_INTERVAL):
+        self.widget = widget
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        # 実行を待っている [コールバック, 引数] (呼ばれた順)
+        self.events = []
+        # coalesce のコールバック -> まだ実行していない events の要素
+        # (post が呼ばれたら後の呼び出しはその後に積む)
+        self.pending = {}
+        # 実行せずに最新の呼び出しに置き換えた回数
+        self.coalesced = 0
+        # メインループを起こした後, flush するまで True
+        self.scheduled = False
+        self.running = False
+        self.after_id = None
+        self.widget.bind(WAKE_EVENT, self.on_wake, add="+")
+        self.start()
+
+    def coalesce(self, callback):
+        """
+        最新の呼び出しだけを次の更新で実行するコールバックを返す。
+        """
+
+        def wrapper(*args):
+            with self.lock:
+                entry = self.pending.get(callback)
+                if entry is not None:
+                    entry[1] = args
+                    self.coalesced += 1
+                else:
+                    entry = [callback, args]
+                    self.pending[callback] = entry
+                    self.events.append(entry)
+                wake = self.request_wake()
+            if wake:
+                self.wake()
+
+        return wrapper
+
+    def post(self, callback, snapshot=None):
+        """
+        呼び出しを順にすべて次の更新で実行するコールバックを返す。
+        snapshot (引数無しの関数) を渡すと、呼ばれた時点 (センサのスレッド) の
+        snapshot() の値を先頭の引数にして実行する (liner.frame など)。
+        """
+
+        def wrapper(*args):
+            if snapshot is not None:
+                args = (snapshot(),) + args
+            with self.lock:
+                self.events.append([callback, args])
+                # 後の更新はこのイベントの後に実行する
+                self.pending = {}
+                wake = self.request_wake()
+            if wake:
+                self.wake()
+
+        return wrapper
+
+    def request_wake(self):
+        # self.lock を持った状態で呼ぶ。メインループを起こす必要があるかを返す
+        if not self.running or self.scheduled:
+            return False
+        self.scheduled = True
+        return True
+
+    def wake(self):
+        # センサのスレッドで呼ばれる (ロックを持たずに呼ぶ)
+        try:
+            self.widget.event_generate(WAKE_EVENT, when="tail")
+        except RuntimeError:
+            # メインループが終わった後
+            pass
+
+    def on_wake(self, event=None):
+        # メインループのスレッドで実行される
+        if self.running and self.after_id is None:
+            self.after_id = self.widget.after(self.refresh_interval, self.poll)
+
+    def start(self):
+        with self.lock:
+            self.running = True
+            wake = bool(self.events) and self.request_wake()
+        if wake:
+            self.on_wake()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.scheduled = False
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def poll(self):
+        # メインループのスレッドで実行される
+        self.after_id = None
+        try:
+            self.flush()
+        finally:
+            with self.lock:
+                # flush の間に積まれたものがあれば次の更新で実行し、無ければ止める
+                self.scheduled = self.running and bool(self.events)
+            if self.scheduled:
+                self.after_id = self.widget.after(self.refresh_interval, self.poll)
+
+    def flush(self):
+        """
+        溜まったコールバックを呼ばれた順に実行する。
+        """
+        with self.lock:
+            events, self.events = self.events, []
+            self.pending = {}
+        for callback, args in events:
+            callback(*args)